@@ -0,0 +1,184 @@
+import os
+import glob
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from kv_cache import TieredCache, CACHE_DIR
+from utils import safe_print
+
+REPORT_STORE_DIR = os.getenv("REPORT_STORE_DIR", os.path.join(CACHE_DIR, "reports"))
+REPORT_STORE_MEMORY_MB = float(os.getenv("REPORT_STORE_MEMORY_MB", "128"))
+REPORT_STORE_GC_INTERVAL = float(os.getenv("REPORT_STORE_GC_INTERVAL", "3600"))
+# Artifacts stored without an explicit ttl expire after this many seconds (0 keeps them)
+REPORT_STORE_TTL = float(os.getenv("REPORT_STORE_TTL", str(30 * 86400)))
+# Blobs written (or rewritten) this recently are never collected, so a blob whose index
+# entry is still being written is not removed from under it
+REPORT_STORE_GC_GRACE = 600.0
+
+
+class ReportArtifactStore:
+    """Generated report artifacts (PDF bytes, report text, English document) by report key.
+
+    Blobs are written once to a content-addressed directory (``<sha256>.bin``) and the most
+    recently used ones are kept in a memory LRU bounded by ``memory_budget_bytes``. A small
+    persistent index maps ``(key, kind)`` to the blob digest, so lookups by
+    ``create_report_key`` survive restarts while memory stays flat. Entries expire after
+    ``default_ttl`` unless stored with their own ``ttl``. A background thread deletes blobs no
+    live index entry refers to any more (replaced by an edit, expired, or trimmed from the
+    index) every ``gc_interval`` seconds, so the directory does not grow without bound.
+    """
+
+    def __init__(self, directory: str = REPORT_STORE_DIR,
+                 memory_budget_bytes: int = int(REPORT_STORE_MEMORY_MB * 1024 * 1024),
+                 gc_interval: float = REPORT_STORE_GC_INTERVAL, default_ttl: float = REPORT_STORE_TTL):
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        os.makedirs(directory, exist_ok=True)
+        # No memory tier for the index: another worker may repoint a key (an edited report),
+        # and primary-key lookups in SQLite are cheap. Blobs never change, so they are cached.
+        self.index = TieredCache("report_artifacts", max_items=0, default_ttl=default_ttl or None)
+        self.blobs = OrderedDict()
+        self.resident_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_reads": 0, "misses": 0, "writes": 0, "evictions": 0,
+                         "blobs_removed": 0}
+        self.disk_bytes = 0
+        self.gc_interval = gc_interval
+        self.collector = threading.Thread(target=self._collect_forever, name="report-store-gc", daemon=True)
+        self.collector.start()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.bin")
+
+    def _remember(self, digest: str, data: bytes) -> None:
+        if digest in self.blobs:
+            self.blobs.move_to_end(digest)
+            return
+        self.blobs[digest] = data
+        self.resident_bytes += len(data)
+        while self.resident_bytes > self.memory_budget_bytes and len(self.blobs) > 1:
+            _, evicted = self.blobs.popitem(last=False)
+            self.resident_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def put(self, key: str, kind: str, data: bytes, ttl: Optional[float] = None) -> str:
+        """Store a blob for (key, kind) and return its content digest. The entry stops being
+        returned after ``ttl`` seconds (the store's ``default_ttl`` if not given)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        try:
+            # Refresh the mtime of an existing blob so the collector leaves it alone
+            os.utime(path)
+        except OSError:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self._remember(digest, data)
+            self.counters["writes"] += 1
+        self.index.set(f"{kind}:{key}", digest, ttl=ttl)
+        return digest
+
+    def get(self, key: str, kind: str) -> Optional[bytes]:
+        digest = self.index.get(f"{kind}:{key}")
+        if digest is None:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+        with self.lock:
+            data = self.blobs.get(digest)
+            if data is not None:
+                self.blobs.move_to_end(digest)
+                self.counters["memory_hits"] += 1
+                return data
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            safe_print(f"Report artifact {kind} for '{key}' missing on disk: {e}")
+            self.index.delete(f"{kind}:{key}")
+            with self.lock:
+                self.counters["misses"] += 1
+            return None
+        with self.lock:
+            self._remember(digest, data)
+            self.counters["disk_reads"] += 1
+        return data
+
+    def digest(self, key: str, kind: str) -> Optional[str]:
+        """Content digest of the blob stored for (key, kind), usable as an ETag."""
+        return self.index.get(f"{kind}:{key}")
+
+    def has(self, key: str, kind: str) -> bool:
+        digest = self.index.get(f"{kind}:{key}")
+        return digest is not None and (digest in self.blobs or os.path.exists(self._blob_path(digest)))
+
+    def put_text(self, key: str, kind: str, text: str, ttl: Optional[float] = None) -> str:
+        return self.put(key, kind, text.encode("utf-8"), ttl=ttl)
+
+    def get_text(self, key: str, kind: str) -> Optional[str]:
+        data = self.get(key, kind)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_json(self, key: str, kind: str, value: Any, ttl: Optional[float] = None) -> str:
+        return self.put(key, kind, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl=ttl)
+
+    def get_json(self, key: str, kind: str) -> Optional[Any]:
+        data = self.get(key, kind)
+        return json.loads(data) if data is not None else None
+
+    def collect_garbage(self) -> int:
+        """Delete blobs that no live index entry refers to. Returns the number removed."""
+        referenced = set(self.index.live_values())
+        now = time.time()
+        removed = 0
+        disk_bytes = 0
+        for path in glob.glob(os.path.join(self.directory, "*.bin")):
+            digest = os.path.basename(path)[:-len(".bin")]
+            try:
+                stat = os.stat(path)
+                if digest in referenced or now - stat.st_mtime < REPORT_STORE_GC_GRACE:
+                    disk_bytes += stat.st_size
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            with self.lock:
+                data = self.blobs.pop(digest, None)
+                if data is not None:
+                    self.resident_bytes -= len(data)
+        # Temp files of writers that died mid-write
+        for path in glob.glob(os.path.join(self.directory, "*.tmp")):
+            try:
+                if now - os.path.getmtime(path) > REPORT_STORE_GC_GRACE:
+                    os.remove(path)
+            except OSError:
+                pass
+        with self.lock:
+            self.counters["blobs_removed"] += removed
+        self.disk_bytes = disk_bytes
+        if removed:
+            safe_print(f"Removed {removed} unreferenced report artifact(s).")
+        return removed
+
+    def _collect_forever(self) -> None:
+        while True:
+            time.sleep(self.gc_interval)
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                safe_print(f"Report store garbage collection error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["resident_blobs"] = len(self.blobs)
+            stats["resident_bytes"] = self.resident_bytes
+        stats["memory_budget_bytes"] = self.memory_budget_bytes
+        stats["disk_bytes"] = self.disk_bytes
+        return stats
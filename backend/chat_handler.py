@@ -1,30 +1,18 @@
 import os
-import base64
-import tempfile
 import gc
-import sys
+from io import BytesIO
+from typing import Any, Dict, List
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_groq import ChatGroq
-from deep_translator import GoogleTranslator
-
-def safe_print(*args, **kwargs):
-    """Print that ignores characters that cannot be encoded by the terminal."""
-    try:
-        print(*args, **kwargs)
-    except UnicodeEncodeError:
-        new_args = []
-        encoding = sys.stdout.encoding or "ascii"
-        for arg in args:
-            if isinstance(arg, str):
-                new_args.append(arg.encode(encoding, errors="ignore").decode(encoding))
-            else:
-                new_args.append(arg)
-        print(*new_args, **kwargs)
-
+from translation_memory import translate_cached
+from llm_scheduler import get_scheduler, PRIORITY_INTERACTIVE
+from session_manager import SessionManager
+from utils import safe_print
 
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
@@ -38,22 +26,88 @@ embedding_model = HuggingFaceEmbeddings(
 safe_print("Loaded HuggingFace Embeddings: sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 
 
-chat_sessions = {}  
+# Chat sessions expire after CHAT_SESSION_TTL idle seconds; their FAISS stores stay resident
+# between messages and cold ones are reloaded from disk.
+chat_sessions = SessionManager(embedding_model)
 
+# One client shared by every chat turn; calls go through the process-wide LLM scheduler,
+# which owns retries and rate limiting.
+chat_llm = ChatGroq(
+    api_key=groq_api_key,
+    model="llama-3.1-8b-instant",
+    temperature=0.3,
+    max_tokens=400,
+    max_retries=0,
+    model_kwargs={"top_p": 0.9}
+)
 
-def init_chat_from_base64(session_id: str, pdf_base64: str):
-    """Initialize chat session using Base64 PDF (Render memory safe)."""
-    temp_file_path = None
+
+def _create_session(session_id: str, chunks: List[Document]) -> None:
+    """Embed chunks into a FAISS index and register the chat session."""
+    test_embedding = embedding_model.embed_query("test")
+    safe_print(f"Embedding dimension = {len(test_embedding)}")
+
+    vectorstore = FAISS.from_documents(chunks, embedding_model)
+    chat_sessions.create(session_id, vectorstore)
+
+
+def report_document_chunks(report: Dict[str, Any]) -> List[Document]:
+    """Section-aware chunks from a structured report (intro, subtopics, conclusion).
+
+    Each chunk is prefixed with its section heading and carries the section in its metadata,
+    so retrieval hits stay attributable even when a long section is split.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    title = report.get("title", "")
+    labels = report.get("labels", {})
+    sections = [(labels.get("introduction", "Introduction"), "introduction", report.get("intro", ""))]
+    for i, section in enumerate(report.get("sections", []), 1):
+        body = section.get("summary", "")
+        if section.get("insights"):
+            body += f"\n{labels.get('insights', 'Insights')}:\n" + "\n".join(f"- {line}" for line in section["insights"])
+        sections.append((f"{i}. {section.get('title', '')}", "subtopic", body))
+    sections.append((labels.get("conclusion", "Conclusion"), "conclusion", report.get("conclusion", "")))
+
+    chunks = []
+    for heading, kind, body in sections:
+        if not body or not body.strip():
+            continue
+        for part, piece in enumerate(splitter.split_text(body)):
+            chunks.append(Document(
+                page_content=f"{title} - {heading}\n{piece}",
+                metadata={"title": title, "section": heading, "kind": kind, "part": part},
+            ))
+    return chunks
+
+
+def init_chat_from_report(session_id: str, report: Dict[str, Any]):
+    """Initialize chat session straight from a structured report, without a PDF round-trip."""
     try:
-       
-        pdf_bytes = base64.b64decode(pdf_base64)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_bytes)
-            temp_file_path = tmp.name
+        chunks = report_document_chunks(report)
+        if not chunks:
+            raise ValueError("Report has no text to index.")
 
-      
-        loader = PyPDFLoader(temp_file_path)
-        docs = loader.load()
+        _create_session(session_id, chunks)
+
+        safe_print(f"Chat session '{session_id}' initialized from report ({len(chunks)} chunks).")
+        return {"message": f"Chat session '{session_id}' initialized successfully."}
+
+    except Exception as e:
+        safe_print(f"Error initializing chat: {e}")
+        return {"error": str(e)}
+    finally:
+        gc.collect()
+
+
+def init_chat_from_pdf(session_id: str, pdf_bytes: bytes):
+    """Initialize chat session from raw PDF bytes, parsed in memory (no temp file). Used for
+    PDFs the server has no structured report for."""
+    try:
+        reader = PdfReader(BytesIO(pdf_bytes))
+        docs = [
+            Document(page_content=page.extract_text() or "", metadata={"source": session_id, "page": i})
+            for i, page in enumerate(reader.pages)
+        ]
         
         if not docs:
             raise ValueError("No documents loaded from PDF.")
@@ -64,17 +118,7 @@ def init_chat_from_base64(session_id: str, pdf_base64: str):
         if not chunks:
             raise ValueError("No readable text found in the uploaded PDF.")
 
-        test_embedding = embedding_model.embed_query("test")
-        safe_print(f"Embedding dimension = {len(test_embedding)}")
-
-        temp_path = f"/tmp/vectorstore_{session_id}"
-        vectorstore = FAISS.from_documents(chunks, embedding_model)
-        vectorstore.save_local(temp_path)
-
-        chat_sessions[session_id] = {
-            "vectorstore_path": temp_path,
-            "chat_history": [],
-        }
+        _create_session(session_id, chunks)
 
         safe_print(f"Chat session '{session_id}' initialized successfully.")
         return {"message": f"Chat session '{session_id}' initialized successfully."}
@@ -83,34 +127,25 @@ def init_chat_from_base64(session_id: str, pdf_base64: str):
         safe_print(f"Error initializing chat: {e}")
         return {"error": str(e)}
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                safe_print(f"Could not delete temp file: {e}")
-        
         gc.collect()
 
 
 def chat_with_pdf(session_id: str, message: str):
     """Chat with initialized PDF session (Render-safe)."""
     try:
-        if session_id not in chat_sessions:
+        session = chat_sessions.get(session_id)
+        if session is None:
             return {"error": f"No chat session found for '{session_id}'."}
 
-        session = chat_sessions[session_id]
-        temp_path = session["vectorstore_path"]
         chat_history = session["chat_history"]
 
       
         try:
-            user_message_en = GoogleTranslator(source="auto", target="en").translate(message)
+            user_message_en = translate_cached(message, "en", source="auto")
         except:
             user_message_en = message  
 
-        vectorstore = FAISS.load_local(
-            temp_path, embedding_model, allow_dangerous_deserialization=True
-        )
+        vectorstore = chat_sessions.index(session_id)
 
         retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
         
@@ -118,11 +153,9 @@ def chat_with_pdf(session_id: str, message: str):
         docs = retriever.invoke(user_message_en)
 
         translated_docs = []
-        translator = GoogleTranslator(source='auto', target='en')
-        
         for d in docs:
             try:
-                trans_text = translator.translate(d.page_content)
+                trans_text = translate_cached(d.page_content, "en", source="auto")
                 translated_docs.append(trans_text)
             except Exception as e:
                 safe_print(f"Translation failed for chunk: {e}")
@@ -160,19 +193,11 @@ Your task is to answer the user's question based on the context, but you must TR
 
 ### Answer (in English):"""
 
-        llm = ChatGroq(
-            api_key=groq_api_key,
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=400,
-            model_kwargs={"top_p": 0.9}
-        )
-        
-        response = llm.invoke(prompt)
+        response = get_scheduler().invoke(chat_llm, prompt, priority=PRIORITY_INTERACTIVE)
         answer = getattr(response, "content", "").strip() or "No relevant information found."
 
      
-        chat_history.append((message, answer))
+        chat_sessions.append_history(session_id, message, answer)
 
         safe_print(f"[Chat] {session_id} | Q: {message} | A: {answer[:120]}...")
         return {"response": answer}
@@ -186,32 +211,27 @@ Your task is to answer the user's question based on the context, but you must TR
 def chat_with_pdf_stream(session_id: str, message: str):
     """Chat with initialized PDF session and stream response character by character."""
     try:
-        if session_id not in chat_sessions:
+        session = chat_sessions.get(session_id)
+        if session is None:
             yield f"Error: No chat session found for '{session_id}'."
             return
 
-        session = chat_sessions[session_id]
-        temp_path = session["vectorstore_path"]
         chat_history = session["chat_history"]
 
         try:
-            user_message_en = GoogleTranslator(source="auto", target="en").translate(message)
+            user_message_en = translate_cached(message, "en", source="auto")
         except:
             user_message_en = message  
 
-        vectorstore = FAISS.load_local(
-            temp_path, embedding_model, allow_dangerous_deserialization=True
-        )
+        vectorstore = chat_sessions.index(session_id)
 
         retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
         docs = retriever.invoke(user_message_en)
 
         translated_docs = []
-        translator = GoogleTranslator(source='auto', target='en')
-        
         for d in docs:
             try:
-                trans_text = translator.translate(d.page_content)
+                trans_text = translate_cached(d.page_content, "en", source="auto")
                 translated_docs.append(trans_text)
             except Exception as e:
                 translated_docs.append(d.page_content)
@@ -245,22 +265,15 @@ Your task is to answer the user's question based on the context, but you must TR
 
 ### Answer (in English):"""
 
-        llm = ChatGroq(
-            api_key=groq_api_key,
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=400,
-        )
-        
         full_answer = ""
-        for chunk in llm.stream(prompt):
+        for chunk in get_scheduler().stream(chat_llm, prompt, priority=PRIORITY_INTERACTIVE):
             content = getattr(chunk, "content", str(chunk))
             if content:
                 full_answer += content
                 for char in content:
                     yield char
         
-        chat_history.append((message, full_answer))
+        chat_sessions.append_history(session_id, message, full_answer)
 
     except Exception as e:
         yield f"Error: {str(e)}"
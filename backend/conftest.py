@@ -0,0 +1,2 @@
+# test_gen.py is a manual end-to-end script that calls the real LLM and search APIs
+collect_ignore = ["test_gen.py"]
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from kv_cache import CACHE_DIR
+from utils import safe_print
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_MAX_DEPTH = int(os.getenv("REPORT_QUEUE_MAX_DEPTH", "20"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+# A running job whose worker has not sent a heartbeat for this long is assumed lost
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# Used for Retry-After until some jobs have finished
+DEFAULT_JOB_SECONDS = 120.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the queue is at capacity."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Job queue is full, retry in {int(retry_after)}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """Durable FIFO job queue in SQLite, drained by a fixed pool of worker threads.
+
+    Every gunicorn worker process runs its own pool against the same database, so the total
+    number of concurrently running jobs on a host is ``workers`` times the process count. One
+    active job is kept per key: submitting a key that is already queued or running returns
+    that job. Running jobs send heartbeats; jobs whose worker died (restart, crash) are put
+    back in the queue once the heartbeat is older than ``stale_seconds`` and run again, up to
+    ``max_attempts`` times.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], workers: int = REPORT_WORKERS,
+                 max_depth: int = REPORT_QUEUE_MAX_DEPTH, db_path: str = JOB_DB_PATH,
+                 stale_seconds: float = JOB_STALE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, error TEXT, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, heartbeat_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, status)")
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition()
+        self.running = set()
+        self.threads = []
+
+    def start(self) -> None:
+        """Start the worker threads and the maintenance thread (idempotent)."""
+        if self.threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work_forever, name=f"report-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        thread = threading.Thread(target=self._maintain_forever, name="report-job-maintenance", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _transaction(self, fn):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        columns = ("id", "key", "payload", "status", "attempts", "owner", "error",
+                   "created_at", "started_at", "finished_at", "heartbeat_at")
+        job = dict(zip(columns, row))
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _select(self, where: str, params: Tuple = ()) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT id, key, payload, status, attempts, owner, error, created_at, started_at, "
+            f"finished_at, heartbeat_at FROM jobs WHERE {where}", params
+        ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def submit(self, key: str, payload: Dict[str, Any],
+               on_created: Optional[Callable[[Dict[str, Any], int], None]] = None) -> Tuple[Dict[str, Any], bool]:
+        """Queue a job for ``key`` unless one is already active. Returns (job, created).
+
+        ``on_created(job, position)`` is called for a new job before any worker can claim it,
+        with the number of queued jobs ahead of it. Raises QueueFull when ``max_depth`` jobs
+        are already waiting.
+        """
+        def enqueue():
+            existing = self._select("key = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                                    (key, *ACTIVE_STATUSES))
+            if existing is not None:
+                return existing, False
+            queued = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_depth:
+                raise QueueFull(self._retry_after())
+            job_id = uuid.uuid4().hex
+            self.conn.execute(
+                "INSERT INTO jobs (id, key, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, key, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            job = self._select("id = ?", (job_id,))
+            if on_created is not None:
+                on_created(job, queued)
+            return job, True
+
+        job, created = self._transaction(enqueue)
+        if created:
+            with self.wakeup:
+                self.wakeup.notify()
+        return job, created
+
+    def _average_duration(self) -> float:
+        row = self.conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = 'completed' ORDER BY finished_at DESC LIMIT 20)"
+        ).fetchone()
+        return row[0] or DEFAULT_JOB_SECONDS
+
+    def _retry_after(self) -> float:
+        # Time until the queue has drained by one job, assuming every worker is busy
+        return max(1.0, self._average_duration() / max(1, self.workers))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self._select("id = ?", (job_id,))
+
+    def position(self, job: Dict[str, Any]) -> int:
+        """Number of queued jobs ahead of a queued job."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)
+            ).fetchone()[0]
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        def claim():
+            job = self._select("status = 'queued' ORDER BY created_at LIMIT 1")
+            if job is None:
+                return None
+            now = time.time()
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ? WHERE id = ?",
+                (self.owner, now, now, job["id"]),
+            )
+            job.update(status="running", owner=self.owner, attempts=job["attempts"] + 1)
+            return job
+
+        return self._transaction(claim)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND owner = ?",
+                (status, error, time.time(), job_id, self.owner),
+            )
+
+    def _work_forever(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                safe_print(f"Could not claim report job: {e}")
+                job = None
+            if job is None:
+                with self.wakeup:
+                    self.wakeup.wait(JOB_POLL_INTERVAL)
+                continue
+
+            with self.lock:
+                self.running.add(job["id"])
+            try:
+                self.handler(job)
+                self._finish(job["id"], "completed")
+            except Exception as e:
+                safe_print(f"[ERROR] Job {job['id']} ({job['key']}) failed: {e}")
+                self._finish(job["id"], "failed", str(e))
+            finally:
+                with self.lock:
+                    self.running.discard(job["id"])
+
+    def maintain(self) -> int:
+        """Heartbeat running jobs, requeue lost ones and drop old finished ones. Returns the
+        number of jobs requeued."""
+        now = time.time()
+
+        def sweep():
+            if self.running:
+                marks = ",".join("?" * len(self.running))
+                self.conn.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({marks})",
+                                  (now, *self.running))
+            stale = self.conn.execute(
+                "SELECT id, attempts FROM jobs WHERE status = 'running' AND heartbeat_at < ?",
+                (now - self.stale_seconds,),
+            ).fetchall()
+            requeued = 0
+            for job_id, attempts in stale:
+                if attempts >= self.max_attempts:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = 'worker lost too many times', "
+                        "finished_at = ? WHERE id = ?", (now, job_id))
+                else:
+                    self.conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ?", (job_id,))
+                    requeued += 1
+            self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+                (now - JOB_RETENTION_SECONDS,),
+            )
+            return requeued
+
+        requeued = self._transaction(sweep)
+        if requeued:
+            safe_print(f"Requeued {requeued} interrupted report job(s).")
+            with self.wakeup:
+                self.wakeup.notify_all()
+        return requeued
+
+    def _maintain_forever(self) -> None:
+        while True:
+            try:
+                self.maintain()
+            except Exception as e:
+                safe_print(f"Report job maintenance error: {e}")
+            time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            average = self._average_duration()
+            running_here = len(self.running)
+        return {
+            "workers": self.workers,
+            "max_depth": self.max_depth,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "running_here": running_here,
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "average_job_seconds": round(average, 1),
+        }
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from utils import safe_print
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+
+
+def content_hash(*parts: Any) -> str:
+    """Stable SHA-256 key for a tuple of JSON-serializable parts."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """Two-tier key/value cache: an in-memory LRU in front of a SQLite file.
+
+    Values must be JSON-serializable. Entries may carry a TTL (seconds); expired entries are
+    treated as misses and purged from disk periodically, and the disk tier is trimmed to
+    ``max_disk_items`` least recently written entries. With ``max_items=0`` every lookup goes
+    to SQLite, which keeps processes sharing the file coherent.
+    """
+
+    def __init__(self, name: str, db_path: Optional[str] = None, max_items: int = 1024,
+                 default_ttl: Optional[float] = None, max_disk_items: int = 100000):
+        self.name = name
+        self.db_path = db_path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.max_items = max_items
+        self.default_ttl = default_ttl
+        self.max_disk_items = max_disk_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.conn = None
+        try:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, updated_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+        except Exception as e:
+            safe_print(f"⚠️ {name} cache running memory-only, could not open {self.db_path}: {e}")
+            self.conn = None
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    def _remember(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        if self.max_items <= 0:
+            return
+        self.memory[key] = (value, expires_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return value
+                del self.memory[key]
+
+            if self.conn is not None:
+                try:
+                    row = self.conn.execute(
+                        "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    safe_print(f"⚠️ {self.name} cache read failed: {e}")
+                    row = None
+                if row is not None and (row[1] is None or row[1] > now):
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.counters["disk_hits"] += 1
+                    return value
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = self._expiry(ttl)
+        with self.lock:
+            self._remember(key, value, expires_at)
+            self.counters["writes"] += 1
+            if self.conn is None:
+                return
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at, time.time()),
+                )
+                if self.counters["writes"] % 500 == 0:
+                    self._prune()
+                self.conn.commit()
+            except sqlite3.Error as e:
+                safe_print(f"⚠️ {self.name} cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self.memory.pop(key, None)
+            if self.conn is not None:
+                try:
+                    self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    safe_print(f"⚠️ {self.name} cache delete failed: {e}")
+
+    def live_values(self) -> List[Any]:
+        """Values of every unexpired entry (from the disk tier when there is one)."""
+        now = time.time()
+        with self.lock:
+            if self.conn is None:
+                return [v for v, expires_at in self.memory.values() if expires_at is None or expires_at > now]
+            rows = self.conn.execute(
+                "SELECT value FROM entries WHERE expires_at IS NULL OR expires_at > ?", (now,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _prune(self) -> None:
+        """Drop expired rows and trim the disk tier to its size budget (caller holds the lock)."""
+        self.conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        self.conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM entries ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_items,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_items"] = len(self.memory)
+            if self.conn is not None:
+                try:
+                    stats["disk_items"] = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        return stats
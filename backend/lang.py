@@ -1,5 +1,6 @@
-from typing import List, Dict, Any, TypedDict
+from typing import List, Dict, Any, Callable, Optional, TypedDict, Annotated
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 from langchain_groq import ChatGroq
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -10,7 +11,7 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.fonts import addMapping
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
-import os, re
+import os, re, json, time
 import requests
 from datetime import datetime
 import numpy as np
@@ -18,25 +19,16 @@ from random import choice
 from langchain_community.utilities import WikipediaAPIWrapper
 from langchain_community.tools import DuckDuckGoSearchRun
 from io import BytesIO
-import base64
 from dotenv import load_dotenv
-from deep_translator import GoogleTranslator
-import sys
-
-def safe_print(*args, **kwargs):
-    """Print that ignores characters that cannot be encoded by the terminal."""
-    try:
-        print(*args, **kwargs)
-    except UnicodeEncodeError:
-        new_args = []
-        encoding = sys.stdout.encoding or "ascii"
-        for arg in args:
-            if isinstance(arg, str):
-                new_args.append(arg.encode(encoding, errors="ignore").decode(encoding))
-            else:
-                new_args.append(arg)
-        print(*new_args, **kwargs)
-
+from translation_memory import translate_batch
+from llm_scheduler import get_scheduler, DeadlineExceeded, PRIORITY_INTERACTIVE, PRIORITY_REPORT
+from kv_cache import TieredCache, content_hash, CACHE_DIR
+from utils import safe_print
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 
 load_dotenv()
 
@@ -44,6 +36,15 @@ groq_api_key = os.getenv("GROQ_API_KEY")
 wiki_wrapper = WikipediaAPIWrapper()
 search = DuckDuckGoSearchRun()
 
+# "fanout" runs one graph branch per subtopic; "streaming" pushes subtopics through
+# retrieve -> summarize -> analyze worker stages connected by bounded queues.
+PIPELINE_MODE = os.getenv("REPORT_PIPELINE_MODE", "fanout").lower()
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "3"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+# "separate" runs heading -> (intro || planner); "consolidated" asks for heading, intro and
+# subtopic plan in one structured JSON call.
+PROMPT_MODE = os.getenv("REPORT_PROMPT_MODE", "separate").lower()
+
 
 LANGUAGE_CODES = {
     "English": "en",
@@ -60,63 +61,6 @@ LANGUAGE_CODES = {
 
 
 
-# Translation cache to avoid redundant API calls
-_translation_cache = {}
-
-def translate_long_text(text: str, target_language: str, max_chunk: int = 4500) -> str:
-    """Translate text in parallel using chunks. Returns original if translation fails."""
-    if target_language == "English" or not text or not text.strip():
-        return text
-    
-    # Check cache for exact matches (useful for headings/labels)
-    cache_key = (text, target_language)
-    if cache_key in _translation_cache:
-        return _translation_cache[cache_key]
-    
-    try:
-        lang_code = LANGUAGE_CODES.get(target_language, "en")
-        if lang_code == "en":
-            return text
-        
-        translator = GoogleTranslator(source='en', target=lang_code)
-        
-        # For short strings, just translate directly
-        if len(text) <= 500:
-            res = translator.translate(text)
-            _translation_cache[cache_key] = res
-            return res
-
-        # For long text, split into logical blocks (paragraphs)
-        paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-        if not paragraphs:
-            return text
-
-        # Translate paragraphs in parallel
-        from concurrent.futures import ThreadPoolExecutor
-        def _safe_translate(t):
-            try:
-                # Cache at paragraph level too
-                p_cache_key = (t, target_language)
-                if p_cache_key in _translation_cache:
-                    return _translation_cache[p_cache_key]
-                
-                res = translator.translate(t)
-                _translation_cache[p_cache_key] = res
-                return res
-            except:
-                return t
-
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            translated_paragraphs = list(executor.map(_safe_translate, paragraphs))
-        
-        result = "\n\n".join(translated_paragraphs)
-        _translation_cache[cache_key] = result
-        return result
-
-    except Exception as e:
-        safe_print(f"PDF translation error: {e}")
-        return text
-
 LANGUAGE_FONT_FAMILY = {
     "Hindi": "NotoSansDevanagari",
     "Marathi": "NotoSansDevanagari",
@@ -239,184 +183,572 @@ def get_font_for_language(language: str) -> str:
     registered_family = _ensure_register_font_family(family)
     return registered_family or "Helvetica"
 
-def translate_text(text: str, target_language: str) -> str:
-    """Translate text to target language using Google Translate."""
-    if target_language == "English" or not text:
-        return text
-    
-    try:
-        lang_code = LANGUAGE_CODES.get(target_language, "en")
-        if lang_code == "en":
-            return text
-        
-        max_chunk_size = 4500
-        if len(text) <= max_chunk_size:
-            translator = GoogleTranslator(source='en', target=lang_code)
-            return translator.translate(text)
-        else:
-            paragraphs = text.split('\n')
-            translated_paragraphs = []
-            for para in paragraphs:
-                if para.strip():
-                    translator = GoogleTranslator(source='en', target=lang_code)
-                    translated_paragraphs.append(translator.translate(para))
-                else:
-                    translated_paragraphs.append('')
-            return '\n'.join(translated_paragraphs)
-    except Exception as e:
-        safe_print(f"Translation error for {target_language}: {e}")
-        return text
+def merge_dicts(left: Dict[str, str], right: Dict[str, str]) -> Dict[str, str]:
+    """Reducer that lets parallel subtopic branches write into the same dict channel."""
+    merged = dict(left or {})
+    merged.update(right or {})
+    return merged
 
 class GraphState(TypedDict):
     topic: str
     heading: str
     intro: str
     subtopics: List[str]
-    content: Dict[str, str]
-    summaries: Dict[str, str]
-    insights: Dict[str, str]
+    content: Annotated[Dict[str, str], merge_dicts]
+    summaries: Annotated[Dict[str, str], merge_dicts]
+    insights: Annotated[Dict[str, str], merge_dicts]
     conclusion: str
  
     pdf_path: str
-    pdf_base64: str
+    pdf_bytes: bytes
+    english_document: Dict[str, Any]
     language: str
     pages: int
     report_text: str
+
+class SubtopicState(TypedDict):
+    topic: str
+    subtopic: str
     
 
 groq_llm = ChatGroq(
     api_key=groq_api_key,
     temperature=0.7,
-    model_name="llama-3.1-8b-instant"
+    model_name="llama-3.1-8b-instant",
+    # Retries are handled by the shared scheduler so they respect the global rate limit.
+    max_retries=0
+)
+
+# Responses are cached by (model, temperature, prompt); prompts grounded in live web results
+# get a shorter TTL so reports pick up fresh search content.
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_GROUNDED_CACHE_TTL = float(os.getenv("LLM_GROUNDED_CACHE_TTL", str(24 * 3600)))
+llm_cache = TieredCache(
+    "llm_responses",
+    max_items=int(os.getenv("LLM_CACHE_MAX_ITEMS", "2048")),
+    default_ttl=LLM_CACHE_TTL,
 )
 
+def invoke_llm(prompt: str, priority: int = PRIORITY_REPORT, cache: bool = True, ttl: float = None) -> str:
+    """Run a prompt through the response cache and the process-wide LLM scheduler; return the text."""
+    key = content_hash(groq_llm.model_name, groq_llm.temperature, prompt) if cache else None
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    response = get_scheduler().invoke(groq_llm, prompt, priority=priority)
+    text = getattr(response, "content", str(response))
+    if key and text:
+        llm_cache.set(key, text, ttl=ttl)
+    return text
+
+def stream_llm_lines(prompt: str, on_line: Callable[[str], None], priority: int = PRIORITY_REPORT) -> str:
+    """Like invoke_llm, but streams the response and calls ``on_line`` with every line as soon
+    as it is complete. A cached response is returned without calling ``on_line``."""
+    key = content_hash(groq_llm.model_name, groq_llm.temperature, prompt)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        return cached
+
+    text, partial = "", ""
+    try:
+        for chunk in get_scheduler().stream(groq_llm, prompt, priority=priority):
+            content = getattr(chunk, "content", str(chunk))
+            text += content
+            *lines, partial = (partial + content).split("\n")
+            for line in lines:
+                on_line(line)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        safe_print(f"Streaming LLM call failed ({e}), retrying without streaming.")
+        return invoke_llm(prompt, priority=priority)
+    if partial:
+        on_line(partial)
+    if text:
+        llm_cache.set(key, text)
+    return text
+
+def num_subtopics_for_pages(pages: int) -> int:
+    return 1 + (2 * (pages - 2))
+
+def generate_heading(topic: str) -> str:
+    prompt = f"Give a 2-3 word heading title for the topic '{topic}' in English. If the topic is already of 1-4 words just give same title. Return ONLY the title."
+    return invoke_llm(prompt).strip()
+
+def generate_intro(heading: str) -> str:
+    prompt = f"Write a comprehensive introduction (about 200-250 words) about the topic '{heading}' in English. Include background context, significance, and what will be covered."
+    return invoke_llm(prompt)
+
+def parse_subtopics(text: str, topic: str, pages: int) -> List[str]:
+    subtopics = [re.sub(r'^[-•*\d.\s]+', '', l).strip() for l in text.split("\n") if l.strip()]
+    return subtopics[:num_subtopics_for_pages(pages)] or [f"Overview of {topic}", "Key Aspects", "Future Outlook"]
+
+# Stream the planner response and start the web search of each subtopic as soon as its bullet
+# line is complete, overlapping planning with the first searches.
+PLANNER_SPECULATION = os.getenv("PLANNER_SPECULATION", "1") != "0"
+
+def plan_subtopics(topic: str, heading: str, pages: int) -> List[str]:
+    prompt = f"Break the topic '{heading}' into exactly {pages} major subtopics in English. Return only bullet points."
+    if not PLANNER_SPECULATION:
+        return parse_subtopics(invoke_llm(prompt), topic, pages)
+
+    limit = num_subtopics_for_pages(pages)
+    speculated = []
+
+    def on_line(line):
+        sub = re.sub(r'^[-•*\d.\s]+', '', line).strip()
+        if sub and len(speculated) < limit:
+            speculated.append(sub)
+            # Cached subtopics never reach retrieval, so a search for them would be wasted
+            if cached_subtopic(topic, sub) is None:
+                speculate_retrieval(topic, sub)
+
+    subtopics = parse_subtopics(stream_llm_lines(prompt, on_line), topic, pages)
+    for sub in speculated:
+        if sub not in subtopics:
+            discard_speculation(topic, sub)
+    return subtopics
+
+def heading_agent(state: GraphState) -> Dict[str, Any]:
+    """Generate the report heading once; intro and planner both build on it."""
+    return {"heading": generate_heading(state["topic"])}
+
 def intro_agent(state: GraphState) -> Dict[str, Any]:
     """Generate a longer introduction about the main topic."""
-    language = state.get("language", "English")
-    
-    prompt1 = f"Give a 2-3 word heading title for the topic '{state['topic']}' in English. If the topic is already of 1-4 words just give same title. Return ONLY the title."
-    response_heading = groq_llm.invoke(prompt1)     
-    heading = getattr(response_heading, "content", str(response_heading)).strip()
-    
-    prompt = f"Write a comprehensive introduction (about 200-250 words) about the topic '{heading}' in English. Include background context, significance, and what will be covered."
-    response = groq_llm.invoke(prompt)
-    intro_text = getattr(response, "content", str(response))
-    
-    return {"intro": intro_text}
+    return {"intro": generate_intro(state.get("heading") or state["topic"])}
 
 def planner_agent(state: GraphState) -> Dict[str, Any]:
     topic = state["topic"]
     pages = state.get("pages", 3)
-    language = state.get("language", "English")
-    
-    num_subtopics = 1 + (2 * (pages - 2))
     
     safe_print(f"Pages: {pages}")
 
-    prompt1 = f"Give a 2-3 word heading title for the topic '{topic}' in English. Return ONLY the title."
-  
-    response_heading = groq_llm.invoke(prompt1)
-    
-    heading = getattr(response_heading, "content", str(response_heading)).strip()
-    prompt = f"Break the topic '{heading}' into exactly {pages} major subtopics in English. Return only bullet points."
-    
-    response = groq_llm.invoke(prompt)
-    text = getattr(response, "content", str(response))
-    subtopics = [re.sub(r'^[-•*\d.\s]+', '', l).strip() for l in text.split("\n") if l.strip()]
-    
-    subtopics = subtopics[:num_subtopics] or [f"Overview of {topic}", "Key Aspects", "Future Outlook"]
-    
+    return {"subtopics": plan_subtopics(topic, state.get("heading") or topic, pages)}
+
+def outline_agent(state: GraphState) -> Dict[str, Any]:
+    """Consolidated mode: heading, intro and subtopic plan from a single structured LLM call.
+
+    Falls back to the separate heading/intro/planner prompts if the response is not valid JSON.
+    """
+    topic = state["topic"]
+    pages = state.get("pages", 3)
+
+    safe_print(f"Pages: {pages}")
+
+    prompt = (
+        f"For the topic '{topic}', return ONLY a JSON object with these keys, all in English:\n"
+        f'"heading": a 2-3 word heading title (if the topic is already 1-4 words, use it as is),\n'
+        f'"intro": a comprehensive introduction (about 200-250 words) including background context, significance, and what will be covered,\n'
+        f'"subtopics": a list of exactly {pages} major subtopics of the topic.'
+    )
+    try:
+        text = invoke_llm(prompt)
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        outline = json.loads(match.group(0)) if match else {}
+        heading = str(outline.get("heading", "")).strip()
+        intro = str(outline.get("intro", "")).strip()
+        subtopics = [str(sub) for sub in outline.get("subtopics", []) if str(sub).strip()]
+        if heading and intro and subtopics:
+            return {
+                "heading": heading,
+                "intro": intro,
+                "subtopics": parse_subtopics("\n".join(subtopics), topic, pages),
+            }
+        safe_print("Consolidated outline incomplete, falling back to separate prompts.")
+    except Exception as e:
+        safe_print(f"Consolidated outline failed ({e}), falling back to separate prompts.")
+
+    heading = generate_heading(topic)
     return {
         "heading": heading,
-        "subtopics": subtopics
+        "intro": generate_intro(heading),
+        "subtopics": plan_subtopics(topic, heading, pages),
     }
 
-from concurrent.futures import ThreadPoolExecutor
+def normalize_key_text(text: str) -> str:
+    """Case, punctuation and whitespace-insensitive form of a topic, subtopic or query."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+# Search results are cached per source and normalized query, truncated to what the prompts
+# use. Web results go stale quickly; Wikipedia articles change slowly.
+SEARCH_SOURCES = {
+    "web": {"tool": lambda: search, "max_chars": 2000,
+            "ttl": float(os.getenv("SEARCH_CACHE_TTL_WEB", str(6 * 3600)))},
+    "wikipedia": {"tool": lambda: wiki_wrapper, "max_chars": 1500,
+                  "ttl": float(os.getenv("SEARCH_CACHE_TTL_WIKIPEDIA", str(7 * 24 * 3600)))},
+}
+search_cache = TieredCache("search_results", max_items=int(os.getenv("SEARCH_CACHE_MAX_ITEMS", "1024")))
+_search_counters = {source: {"hits": 0, "misses": 0, "errors": 0} for source in SEARCH_SOURCES}
+_search_counters_lock = threading.Lock()
+
+def _count_search(source: str, outcome: str) -> None:
+    with _search_counters_lock:
+        _search_counters[source][outcome] += 1
+
+def cached_search(source: str, query: str) -> str:
+    """Run ``query`` against a search source ("web" or "wikipedia") through the search cache.
+
+    Failures are not cached and propagate, so callers can fall back to another source.
+    """
+    config = SEARCH_SOURCES[source]
+    key = content_hash(source, normalize_key_text(query))
+    cached = search_cache.get(key)
+    if cached is not None:
+        _count_search(source, "hits")
+        return cached
+
+    _count_search(source, "misses")
+    try:
+        results = config["tool"]().run(query)[:config["max_chars"]]
+    except Exception:
+        _count_search(source, "errors")
+        raise
+    if results:
+        search_cache.set(key, results, ttl=config["ttl"])
+    return results
+
+def search_stats() -> Dict[str, Any]:
+    with _search_counters_lock:
+        sources = {source: dict(counters) for source, counters in _search_counters.items()}
+    return {"sources": sources, "cache": search_cache.stats(),
+            "retrieval_pool_replacements": retrieval_pool.replacements}
+
+# Retrieval starts with the web search; Wikipedia is queried as well once the web search has
+# failed or taken longer than the hedge delay, and the first usable result wins. Whatever has
+# not answered by the deadline is abandoned (its result still lands in the search cache).
+RETRIEVAL_HEDGE_SECONDS = float(os.getenv("RETRIEVAL_HEDGE_SECONDS", "4"))
+RETRIEVAL_DEADLINE_SECONDS = float(os.getenv("RETRIEVAL_DEADLINE_SECONDS", "20"))
+
+class RetrievalPool:
+    """Thread pool for searches that replaces itself once too many of its calls are stuck.
+
+    Neither search client takes a timeout, so a hung call holds its thread for good. When
+    ``stuck_limit`` calls have been running for longer than ``stuck_after`` seconds, queued
+    searches are cancelled (their callers move on) and new ones go to a fresh pool; the old
+    one is left to its hung threads.
+    """
+
+    def __init__(self, workers: int, stuck_after: float, stuck_limit: int):
+        self.workers = workers
+        self.stuck_after = stuck_after
+        self.stuck_limit = stuck_limit
+        self.lock = threading.Lock()
+        self.replacements = 0
+        self._start_executor()
+
+    def _start_executor(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="retrieval")
+        self.running = {}
+
+    def submit(self, fn, *args) -> Future:
+        with self.lock:
+            now = time.monotonic()
+            stuck = sum(1 for started in self.running.values() if now - started > self.stuck_after)
+            if stuck >= self.stuck_limit:
+                safe_print(f"{stuck} searches are stuck, replacing the retrieval pool.")
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self._start_executor()
+                self.replacements += 1
+            running = self.running
+
+            def call():
+                token = object()
+                with self.lock:
+                    running[token] = time.monotonic()
+                try:
+                    return fn(*args)
+                finally:
+                    with self.lock:
+                        running.pop(token, None)
+
+            return self.executor.submit(call)
+
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+# A search still running past the deadline is of no use to anyone
+retrieval_pool = RetrievalPool(RETRIEVAL_WORKERS, stuck_after=RETRIEVAL_DEADLINE_SECONDS,
+                               stuck_limit=max(1, RETRIEVAL_WORKERS // 2))
+
+def retrieval_queries(sub: str, topic: str) -> Dict[str, str]:
+    return {"web": f"{sub} {topic} latest 2025", "wikipedia": f"{sub} {topic}"}
+
+# Web searches started by the planner before the subtopic pipeline reaches them, by
+# normalized (topic, subtopic). Entries nobody claims are dropped after SPECULATION_MAX_AGE.
+SPECULATION_MAX_AGE = 600
+_speculative_searches = {}
+_speculation_lock = threading.Lock()
+
+def _speculation_key(topic: str, sub: str):
+    return normalize_key_text(topic), normalize_key_text(sub)
+
+def speculate_retrieval(topic: str, sub: str) -> None:
+    """Start the web search for a planned subtopic; retrieve_context picks it up later."""
+    key = _speculation_key(topic, sub)
+    now = time.monotonic()
+    with _speculation_lock:
+        for stale in [k for k, (_, at) in _speculative_searches.items() if now - at > SPECULATION_MAX_AGE]:
+            _speculative_searches.pop(stale)[0].cancel()
+        if key in _speculative_searches:
+            return
+        future = retrieval_pool.submit(cached_search, "web", retrieval_queries(sub, topic)["web"])
+        _speculative_searches[key] = (future, now)
+
+def take_speculation(topic: str, sub: str) -> Optional[Future]:
+    with _speculation_lock:
+        entry = _speculative_searches.pop(_speculation_key(topic, sub), None)
+    return entry[0] if entry else None
+
+def discard_speculation(topic: str, sub: str) -> None:
+    """Drop a speculative search for a subtopic the final plan does not contain. One that is
+    already running finishes into the search cache."""
+    future = take_speculation(topic, sub)
+    if future is not None:
+        future.cancel()
+
+def retrieve_context(sub: str, topic: str):
+    """Best search context available for a subtopic within the deadline, as (source, text).
+    Returns (None, "") if neither source produced anything in time."""
+    queries = retrieval_queries(sub, topic)
+    started = time.monotonic()
+    deadline = started + RETRIEVAL_DEADLINE_SECONDS
+    web = take_speculation(topic, sub) or retrieval_pool.submit(cached_search, "web", queries["web"])
+    pending = {web: "web"}
+    hedged = False
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        until = deadline if hedged else min(deadline, started + RETRIEVAL_HEDGE_SECONDS)
+        done, _ = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+        # Prefer the web result when both sources answered at once
+        for future in sorted(done, key=lambda f: pending[f] != "web"):
+            source = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                safe_print(f"{source} search failed for '{sub}': {e}")
+                continue
+            if text:
+                for other in pending:
+                    other.cancel()
+                return source, text
+        if not hedged and (not pending or time.monotonic() >= started + RETRIEVAL_HEDGE_SECONDS):
+            pending[retrieval_pool.submit(cached_search, "wikipedia", queries["wikipedia"])] = "wikipedia"
+            hedged = True
+
+    if pending:
+        safe_print(f"Retrieval for '{sub}' hit the {RETRIEVAL_DEADLINE_SECONDS:.0f}s deadline.")
+        for future in pending:
+            future.cancel()
+    return None, ""
+
+def fetch_subtopic_content(sub: str, topic: str) -> str:
+    """Gather web (or Wikipedia) context for a subtopic and write an informative paragraph."""
+    try:
+        source, context = retrieve_context(sub, topic)
+        if source == "web":
+            prompt = f"Based on this current information from the web: {context[:2000]}\n\nWrite a detailed, up-to-date informative paragraph about '{sub}' in the context of '{topic}' in English. Include recent developments and current statistics where relevant."
+        elif source == "wikipedia":
+            prompt = f"Based on this information: {context[:1500]}\n\nWrite a detailed informative paragraph about '{sub}' in the context of '{topic}' in English."
+        else:
+            prompt = f"Write a detailed, up-to-date informative paragraph about '{sub}' in the context of '{topic}' in English. Focus on recent developments and current trends as of 2024-2025."
+
+        return invoke_llm(prompt, ttl=LLM_GROUNDED_CACHE_TTL) or f"Content for {sub}"
+    except DeadlineExceeded:
+        # The scheduler gave up on the LLM: fail the run (it resumes from its checkpoint)
+        # rather than put placeholder text in the report
+        raise
+    except Exception as e:
+        safe_print(f"Error fetching content for {sub}: {e}")
+        return f"Information about {sub} in the context of {topic}."
+
+def summarize_subtopic(sub: str, text: str) -> str:
+    try:
+        prompt = f"Summarize this content about '{sub}' into a single coherent paragraph (no bullet points) in English: {text[:1500]}"
+        return invoke_llm(prompt)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        safe_print(f"Error summarizing {sub}: {e}")
+        return text[:300] + "..."
+
+def analyze_subtopic(sub: str, summary: str) -> str:
+    try:
+        prompt = f"List 3 key insights or takeaways from this text in English:\n{summary}"
+        text = invoke_llm(prompt)
+
+        cleaned_lines = []
+        for l in text.split("\n"):
+            l = re.sub(r'(?i)here are.*insights.*', '', l)
+            if l.strip():
+                line_clean = re.sub(r'^[-•*\d.\s]+', '', l).strip()
+                cleaned_lines.append(f"- {line_clean}")
+        return "\n".join(cleaned_lines).strip()
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        safe_print(f"Error analyzing {sub}: {e}")
+        return "- Insight 1\n- Insight 2\n- Insight 3"
+
+# Retrieved content, summary and insights per (topic, subtopic), so a report re-planned with
+# more pages (or a similar topic wording) only researches the subtopics that are new.
+SUBTOPIC_CACHE_TTL = float(os.getenv("SUBTOPIC_CACHE_TTL", str(24 * 3600)))
+subtopic_cache = TieredCache(
+    "subtopic_results",
+    max_items=int(os.getenv("SUBTOPIC_CACHE_MAX_ITEMS", "512")),
+    default_ttl=SUBTOPIC_CACHE_TTL,
+)
 
-def retriever_agent(state: GraphState) -> Dict[str, Any]:
-    content = {}
-    subtopics = state.get("subtopics", [])
+def subtopic_cache_key(topic: str, sub: str) -> str:
+    return content_hash(normalize_key_text(topic), normalize_key_text(sub))
+
+def cached_subtopic(topic: str, sub: str):
+    """(content, summary, insights) cached for a subtopic, or None."""
+    entry = subtopic_cache.get(subtopic_cache_key(topic, sub))
+    return (entry["content"], entry["summary"], entry["insights"]) if entry else None
+
+def remember_subtopic(topic: str, sub: str, text: str, summary: str, insight: str) -> None:
+    # Placeholder text from failed LLM calls is not worth keeping for a day
+    if text in (f"Content for {sub}", f"Information about {sub} in the context of {topic}."):
+        return
+    if insight == "- Insight 1\n- Insight 2\n- Insight 3":
+        return
+    subtopic_cache.set(subtopic_cache_key(topic, sub),
+                       {"content": text, "summary": summary, "insights": insight})
+
+def subtopic_agent(state: SubtopicState) -> Dict[str, Any]:
+    """Retrieve, summarize and analyze one subtopic as an independent graph branch."""
+    sub = state["subtopic"]
     topic = state.get("topic", "")
-    
-    def fetch_subtopic_content(sub):
+
+    cached = cached_subtopic(topic, sub)
+    if cached:
+        text, summary, insight = cached
+    else:
+        text = fetch_subtopic_content(sub, topic)
+        summary = summarize_subtopic(sub, text)
+        insight = analyze_subtopic(sub, summary)
+        remember_subtopic(topic, sub, text, summary, insight)
+
+    return {
+        "content": {sub: text},
+        "summaries": {sub: summary},
+        "insights": {sub: insight},
+    }
+
+_STAGE_DONE = object()
+
+class _StageError:
+    """Marker carrying an exception raised by a stage; later stages pass it on untouched."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def _start_stage(fn, inbox: queue.Queue, outbox: queue.Queue, workers: int) -> List[threading.Thread]:
+    """Start worker threads that apply fn to every inbox item and forward results to outbox.
+
+    The end-of-stream marker is passed between the stage's workers; the last one to exit
+    forwards it downstream so the next stage knows no more items are coming. An item fn
+    raises on becomes a _StageError, so the stream still ends and the collector sees it.
+    """
+    remaining = [workers]
+    lock = threading.Lock()
+
+    def loop():
         try:
-            search_query = f"{sub} {topic} latest 2025"
-            try:
-                search_results = search.run(search_query)
-                prompt = f"Based on this current information from the web: {search_results[:2000]}\n\nWrite a detailed, up-to-date informative paragraph about '{sub}' in the context of '{topic}' in English. Include recent developments and current statistics where relevant."
-            except Exception as e:
-                safe_print(f"Web search failed for '{sub}': {e}, trying Wikipedia...")
+            while True:
+                item = inbox.get()
+                if item is _STAGE_DONE:
+                    inbox.put(_STAGE_DONE)
+                    break
+                if isinstance(item, _StageError):
+                    outbox.put(item)
+                    continue
                 try:
-                    wiki_content = wiki_wrapper.run(f"{sub} {topic}")
-                    prompt = f"Based on this information: {wiki_content[:1500]}\n\nWrite a detailed informative paragraph about '{sub}' in the context of '{topic}' in English."
-                except:
-                    prompt = f"Write a detailed, up-to-date informative paragraph about '{sub}' in the context of '{topic}' in English. Focus on recent developments and current trends as of 2024-2025."
-            
-            response = groq_llm.invoke(prompt)
-            return sub, getattr(response, "content", f"Content for {sub}")
-        except Exception as e:
-            safe_print(f"Error fetching content for {sub}: {e}")
-            return sub, f"Information about {sub} in the context of {topic}."
-
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        results = list(executor.map(fetch_subtopic_content, subtopics))
-    
-    for sub, text in results:
+                    result = fn(item)
+                except Exception as e:
+                    result = _StageError(e)
+                outbox.put(result)
+        finally:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                outbox.put(_STAGE_DONE)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    return threads
+
+def run_streaming_pipeline(topic: str, subtopics: List[str], workers: int = PIPELINE_STAGE_WORKERS,
+                           queue_size: int = PIPELINE_QUEUE_SIZE) -> Dict[str, Dict[str, str]]:
+    """Stream subtopics through retrieve -> summarize -> analyze without stage barriers.
+
+    A subtopic is handed to the next stage as soon as it leaves the previous one, so a slow
+    search only delays its own subtopic. Bounded queues keep fast stages from running ahead.
+    Subtopics found in the subtopic cache skip the pipeline. If a stage raises for some
+    subtopic, the others still finish and the first error is raised afterwards.
+    """
+    content, summaries, insights = {}, {}, {}
+    missing = []
+    for sub in subtopics:
+        cached = cached_subtopic(topic, sub)
+        if cached:
+            content[sub], summaries[sub], insights[sub] = cached
+        else:
+            missing.append(sub)
+    if not missing:
+        return {"content": content, "summaries": summaries, "insights": insights}
+
+    to_retrieve = queue.Queue(maxsize=queue_size)
+    to_summarize = queue.Queue(maxsize=queue_size)
+    to_analyze = queue.Queue(maxsize=queue_size)
+    done = queue.Queue()
+
+    _start_stage(lambda sub: (sub, fetch_subtopic_content(sub, topic)), to_retrieve, to_summarize, workers)
+    _start_stage(lambda item: item + (summarize_subtopic(item[0], item[1]),), to_summarize, to_analyze, workers)
+    _start_stage(lambda item: item + (analyze_subtopic(item[0], item[2]),), to_analyze, done, workers)
+
+    for sub in missing:
+        to_retrieve.put(sub)
+    to_retrieve.put(_STAGE_DONE)
+
+    error = None
+    while True:
+        item = done.get()
+        if item is _STAGE_DONE:
+            break
+        if isinstance(item, _StageError):
+            error = error or item.error
+            continue
+        sub, text, summary, insight = item
+        remember_subtopic(topic, sub, text, summary, insight)
         content[sub] = text
-        
-    return {"content": content}
+        summaries[sub] = summary
+        insights[sub] = insight
 
-def summarizer_agent(state: GraphState) -> Dict[str, Any]:
-    summaries = {}
-    content_items = state.get("content", {}).items()
-    
-    def summarize_subtopic(item):
-        sub, text = item
-        try:
-            prompt = f"Summarize this content about '{sub}' into a single coherent paragraph (no bullet points) in English: {text[:1500]}"
-            response = groq_llm.invoke(prompt)
-            return sub, getattr(response, "content", str(response))
-        except Exception as e:
-            safe_print(f"Error summarizing {sub}: {e}")
-            return sub, text[:300] + "..."
+    # Finished subtopics are in the subtopic cache, so a rerun only redoes the failed ones
+    if error is not None:
+        raise error
+    return {"content": content, "summaries": summaries, "insights": insights}
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        results = list(executor.map(summarize_subtopic, content_items))
-    
-    for sub, summary in results:
-        summaries[sub] = summary
-        
-    return {"summaries": summaries}
+def streaming_pipeline_agent(state: GraphState) -> Dict[str, Any]:
+    """Process every planned subtopic through the streaming stage pipeline."""
+    return run_streaming_pipeline(state.get("topic", ""), state.get("subtopics", []))
 
-def analyzer_agent(state: GraphState) -> Dict[str, Any]:
-    insights = {}
-    summary_items = state.get("summaries", {}).items()
-    
-    def analyze_subtopic(item):
-        sub, summary = item
-        try:
-            prompt = f"List 3 key insights or takeaways from this text in English:\n{summary}"
-            response = groq_llm.invoke(prompt)
-            text = getattr(response, "content", str(response))
-
-            cleaned_lines = []
-            for l in text.split("\n"):
-                l = re.sub(r'(?i)here are.*insights.*', '', l)
-                if l.strip():
-                    line_clean = re.sub(r'^[-•*\d.\s]+', '', l).strip()
-                    cleaned_lines.append(f"- {line_clean}")
-            return sub, "\n".join(cleaned_lines).strip()
-        except Exception as e:
-            safe_print(f"Error analyzing {sub}: {e}")
-            return sub, "- Insight 1\n- Insight 2\n- Insight 3"
+def dispatch_subtopics(state: GraphState) -> List[Send]:
+    """Fan out one subtopic pipeline per planned subtopic."""
+    topic = state.get("topic", "")
+    return [Send("subtopic_pipeline", {"topic": topic, "subtopic": sub}) for sub in state.get("subtopics", [])]
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        results = list(executor.map(analyze_subtopic, summary_items))
-    
-    for sub, insight in results:
-        insights[sub] = insight
-        
-    return {"insights": insights}
+def ordered_subtopics(state: dict) -> List[str]:
+    """Subtopics with summaries, in planner order (parallel branches may finish in any order)."""
+    summaries = state.get("summaries", {})
+    ordered = [sub for sub in state.get("subtopics", []) if sub in summaries]
+    ordered += [sub for sub in summaries if sub not in ordered]
+    return ordered
 
 def clean_text(text: str) -> str:
     """Remove markdown and unwanted characters while keeping word spacing."""
@@ -429,8 +761,145 @@ def clean_markdown(text: str) -> str:
     """Basic markdown cleaner for conclusion."""
     return clean_text(text)
 
-def create_pdf_for_state(state: dict, target_lang: str) -> str:
-    """Helper to generate PDF Base64 for a specific language."""
+class ReportSection(TypedDict):
+    title: str
+    summary: str
+    insights: List[str]
+
+class ReportDocument(TypedDict):
+    """Cleaned (and possibly translated) report content, rendered to both markdown and PDF."""
+    language: str
+    title: str
+    labels: Dict[str, str]
+    intro: str
+    sections: List[ReportSection]
+    conclusion: str
+    visualizations: List[str]
+
+REPORT_LABELS = {
+    "introduction": "Introduction",
+    "insights": "Insights",
+    "conclusion": "Conclusion",
+    "visual_summary": "Visual Summary",
+}
+
+def build_report_section(sub: str, summary: str, insights_text: str) -> ReportSection:
+    insights = []
+    for line in insights_text.split("\n"):
+        line = clean_text(re.sub(r"(?i)here\s+are.*insights.*", "", line).strip())
+        if line:
+            insights.append(line)
+    return {
+        "title": re.sub(r'["#*•\-]+', "", sub).strip(),
+        "summary": clean_text(summary),
+        "insights": insights,
+    }
+
+def build_report_document(state: dict) -> ReportDocument:
+    """Clean the graph state into an English report document (done once per report)."""
+    sections = [
+        build_report_section(sub, state["summaries"][sub], state.get("insights", {}).get(sub, ""))
+        for sub in ordered_subtopics(state)
+    ]
+
+    return {
+        "language": "English",
+        "title": re.sub(r'["#*:-]+', "", state.get("heading", "")).strip(),
+        "labels": dict(REPORT_LABELS),
+        "intro": clean_text(state.get("intro", "")),
+        "sections": sections,
+        "conclusion": clean_markdown(state.get("conclusion", "Conclusion not available.")),
+        "visualizations": list(state.get("visualizations") or []),
+    }
+
+def translate_report_document(document: ReportDocument, target_lang: str) -> ReportDocument:
+    """Translate every string of an English report document with one batched translation pass."""
+    lang_code = LANGUAGE_CODES.get(target_lang, "en")
+    if target_lang == "English" or lang_code == "en":
+        return document
+
+    label_keys = list(document["labels"])
+    segments = [document["title"], document["intro"], document["conclusion"]]
+    segments += [document["labels"][k] for k in label_keys]
+    for section in document["sections"]:
+        segments += [section["title"], section["summary"]] + section["insights"]
+
+    try:
+        translated = translate_batch(segments, lang_code)
+    except Exception as e:
+        safe_print(f"Report translation error: {e}")
+        translated = segments
+    # Empty translations fall back to the English text
+    translated = [t if t and t.strip() else seg for t, seg in zip(translated, segments)]
+
+    it = iter(translated)
+    title, intro, conclusion = next(it), next(it), next(it)
+    labels = {k: next(it) for k in label_keys}
+    sections = []
+    for section in document["sections"]:
+        sections.append({
+            "title": next(it),
+            "summary": next(it),
+            "insights": [next(it) for _ in section["insights"]],
+        })
+
+    return {
+        "language": target_lang,
+        "title": title,
+        "labels": labels,
+        "intro": intro,
+        "sections": sections,
+        "conclusion": conclusion,
+        "visualizations": document["visualizations"],
+    }
+
+def render_report_markdown(document: ReportDocument) -> str:
+    """Render a report document as the editable markdown text."""
+    labels = document["labels"]
+    lines = [f"# {document['title']}\n"]
+    lines.append(f"## {labels['introduction']}\n{document['intro']}\n")
+
+    for i, section in enumerate(document["sections"], 1):
+        lines += render_section_lines(section, labels, i)
+
+    lines.append(f"## {labels['conclusion']}\n{document['conclusion']}")
+    return "\n".join(lines)
+
+
+def render_section_lines(section: ReportSection, labels: Dict[str, str], number: int) -> List[str]:
+    lines = []
+    if section["title"]:
+        lines.append(f"## {number}. {section['title']}\n")
+    lines.append(f"{section['summary']}\n")
+
+    if section["insights"]:
+        lines.append(f"### {labels['insights']}")
+        for line in section["insights"]:
+            lines.append(f"- {line}")
+        lines.append("")
+    return lines
+
+
+def preview_report_markdown(partial_state: dict, target_lang: str, number: int = 1) -> str:
+    """Translate and render the part of a report known so far (heading and intro, one
+    subtopic, or the conclusion) as markdown for incremental previews. The translations land
+    in the translation memory, so the final report reuses them."""
+    state = {"heading": "", "intro": "", "conclusion": "", "subtopics": [], "summaries": {}, **partial_state}
+    document = translate_report_document(build_report_document(state), target_lang)
+    labels = document["labels"]
+    lines = []
+    if document["title"]:
+        lines.append(f"# {document['title']}\n")
+    if document["intro"]:
+        lines.append(f"## {labels['introduction']}\n{document['intro']}\n")
+    for section in document["sections"]:
+        lines += render_section_lines(section, labels, number)
+    if document["conclusion"]:
+        lines.append(f"## {labels['conclusion']}\n{document['conclusion']}")
+    return "\n".join(lines)
+
+def render_report_pdf(document: ReportDocument) -> bytes:
+    """Render a report document to a PDF and return its bytes."""
     buffer = BytesIO()
 
     doc = SimpleDocTemplate(
@@ -446,7 +915,7 @@ def create_pdf_for_state(state: dict, target_lang: str) -> str:
     styleN = styles["Normal"]
     title_style = styles["Title"]
 
-    unicode_font = get_font_for_language(target_lang)
+    unicode_font = get_font_for_language(document["language"])
     try:
         pdfmetrics.getFont(unicode_font)
     except Exception:
@@ -475,64 +944,36 @@ def create_pdf_for_state(state: dict, target_lang: str) -> str:
         "Content", parent=styleN, fontName=unicode_font, fontSize=10, leading=13, spaceAfter=7
     )
 
+    labels = document["labels"]
     content = []
 
-    title_clean = re.sub(r'["""*:-]+', "", state.get("heading", "")).strip()
-    translated_title = translate_long_text(title_clean, target_lang)
-    final_title = translated_title if translated_title and translated_title.strip() else title_clean
-    content.append(Paragraph(f"<b>{final_title}</b>", title_bold_style))
+    content.append(Paragraph(f"<b>{document['title']}</b>", title_bold_style))
     content.append(Spacer(1, 12))
 
-    intro_text = clean_text(state.get("intro", ""))
-    intro_text = translate_long_text(intro_text, target_lang)
-    intro_label = translate_long_text("Introduction:", target_lang)
-    content.append(Paragraph(f"<b>{intro_label}</b>", q_style))
-    content.append(Paragraph(intro_text, a_style))
+    content.append(Paragraph(f"<b>{labels['introduction']}:</b>", q_style))
+    content.append(Paragraph(document["intro"], a_style))
     content.append(Spacer(1, 10))
 
-    for i, sub in enumerate(state.get("summaries", {}), 1):
-
-        sub_clean = re.sub(r'["""*•\-]+', "", sub).strip()
-        sub_translated = translate_long_text(sub_clean, target_lang)
-
-        if sub_translated:
-            heading_text = f"<b>{i}. {sub_translated}:</b>"
-            content.append(Paragraph(heading_text, q_style))
+    for i, section in enumerate(document["sections"], 1):
+        if section["title"]:
+            content.append(Paragraph(f"<b>{i}. {section['title']}:</b>", q_style))
 
-        summary_text = clean_text(state["summaries"][sub])
-        summary_text = translate_long_text(summary_text, target_lang)
-        content.append(Paragraph(summary_text, a_style))
+        content.append(Paragraph(section["summary"], a_style))
 
-        if sub in state.get("insights", {}):
-            insights_text = state["insights"][sub]
-            cleaned_lines = []
-            for line in insights_text.split("\n"):
-                line = re.sub(r"(?i)here\s+are.*insights.*", "", line).strip()
-                line = clean_text(line)
-                if line:
-                    cleaned_lines.append(line)
-
-            if cleaned_lines:
-                insights_label = translate_long_text("Insights:", target_lang)
-                content.append(Paragraph(f"<b>{insights_label}</b>", a_style))
-                for line in cleaned_lines:
-                    translated_line = translate_long_text(line, target_lang)
-                    content.append(Paragraph(translated_line, a_style))
+        if section["insights"]:
+            content.append(Paragraph(f"<b>{labels['insights']}:</b>", a_style))
+            for line in section["insights"]:
+                content.append(Paragraph(line, a_style))
 
         content.append(Spacer(1, 4))
 
-    conclusion_label = translate_long_text("Conclusion:", target_lang)
-    content.append(Paragraph(f"<b>{conclusion_label}</b>", q_style))
-
-    conclusion_text = clean_markdown(state.get("conclusion", "Conclusion not available."))
-    conclusion_text = translate_long_text(conclusion_text, target_lang)
-    content.append(Paragraph(conclusion_text, a_style))
+    content.append(Paragraph(f"<b>{labels['conclusion']}:</b>", q_style))
+    content.append(Paragraph(document["conclusion"], a_style))
     content.append(Spacer(1, 20))
 
-    if "visualizations" in state and state["visualizations"]:
-        visual_label = translate_long_text("Visual Summary:", target_lang)
-        content.append(Paragraph(f"<b>{visual_label}</b>", q_style))
-        for img_path in state["visualizations"]:
+    if document["visualizations"]:
+        content.append(Paragraph(f"<b>{labels['visual_summary']}:</b>", q_style))
+        for img_path in document["visualizations"]:
             content.append(Spacer(1, 8))
             content.append(Image(img_path, width=450, height=250))
 
@@ -545,55 +986,70 @@ def create_pdf_for_state(state: dict, target_lang: str) -> str:
     pdf_data = buffer.getvalue()
     buffer.close()
 
-    return base64.b64encode(pdf_data).decode("utf-8")
+    return pdf_data
+
+
+# reportlab rendering is CPU-bound, so PDFs are built in worker processes while the calling
+# thread carries on with I/O-bound translation.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+_render_pool = None
+# Set once a worker process dies; the pool is not restarted because forking now would copy
+# a process that runs threads (scheduler, requests) and may hold their locks
+_render_pool_broken = False
+_render_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """Return the shared PDF render process pool, starting its workers on first use.
+
+    Call this early (the server does at import) so the workers are forked before any
+    scheduler or request threads exist. Returns None when PDF_RENDER_WORKERS is 0 or the
+    pool broke, and PDFs are then rendered in-process.
+    """
+    global _render_pool
+    if _render_pool is None and PDF_RENDER_WORKERS > 0 and not _render_pool_broken:
+        with _render_pool_lock:
+            if _render_pool is None and not _render_pool_broken:
+                pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+                pool.submit(int).result()
+                _render_pool = pool
+    return _render_pool
+
+def _render_pool_failed(error: Exception) -> None:
+    global _render_pool, _render_pool_broken
+    safe_print(f"PDF render worker failed ({error}), rendering in-process from now on.")
+    with _render_pool_lock:
+        _render_pool_broken = True
+        _render_pool = None
+
+def render_report_pdf_async(document: ReportDocument) -> Future:
+    """Start rendering a report document in the process pool (in-process if unavailable)."""
+    pool = get_render_pool()
+    if pool is not None:
+        try:
+            return pool.submit(render_report_pdf, document)
+        except BrokenProcessPool as e:
+            _render_pool_failed(e)
+        except Exception as e:
+            safe_print(f"PDF render pool unavailable ({e}), rendering in-process.")
 
+    future = Future()
+    try:
+        future.set_result(render_report_pdf(document))
+    except Exception as e:
+        future.set_exception(e)
+    return future
 
-def generate_report_text(state: dict, target_lang: str) -> str:
-    """Generate a plain text/markdown version of the report for editing."""
-    lines = []
-    
-    title_clean = re.sub(r'[#*:-]+', "", state.get("heading", "")).strip()
-    translated_title = translate_long_text(title_clean, target_lang)
-    final_title = translated_title if translated_title and translated_title.strip() else title_clean
-    lines.append(f"# {final_title}\n")
-
-    intro_label = translate_long_text("Introduction", target_lang)
-    intro_text = clean_text(state.get("intro", ""))
-    intro_text = translate_long_text(intro_text, target_lang)
-    lines.append(f"## {intro_label}\n{intro_text}\n")
-
-    for i, sub in enumerate(state.get("summaries", {}), 1):
-        sub_clean = re.sub(r'[#*•\-]+', "", sub).strip()
-        sub_translated = translate_long_text(sub_clean, target_lang)
-        
-        if sub_translated:
-            lines.append(f"## {i}. {sub_translated}\n")
-        
-        summary_text = clean_text(state["summaries"][sub])
-        summary_text = translate_long_text(summary_text, target_lang)
-        lines.append(f"{summary_text}\n")
-
-        if sub in state.get("insights", {}):
-            insights_label = translate_long_text("Insights", target_lang)
-            lines.append(f"### {insights_label}")
-            insights_text = state["insights"][sub]
-            for line in insights_text.split("\n"):
-                line = re.sub(r"(?i)here\s+are.*insights.*", "", line).strip()
-                line = clean_text(line)
-                if line:
-                    translated_line = translate_long_text(line, target_lang)
-                    lines.append(f"- {translated_line}")
-            lines.append("")
-
-    conclusion_label = translate_long_text("Conclusion", target_lang)
-    conclusion_text = clean_markdown(state.get("conclusion", "Conclusion not available."))
-    conclusion_text = translate_long_text(conclusion_text, target_lang)
-    lines.append(f"## {conclusion_label}\n{conclusion_text}")
-    
-    return "\n".join(lines)
+def wait_for_pdf(future: Future, document: ReportDocument) -> bytes:
+    """Result of render_report_pdf_async; re-renders in-process if the worker process died,
+    and keeps rendering in-process from then on."""
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        _render_pool_failed(e)
+        return render_report_pdf(document)
 
 
-def create_pdf_from_text(text: str, target_lang: str) -> str:
+def create_pdf_from_text(text: str, target_lang: str) -> bytes:
     """Generate PDF from a raw text (markdown-ish)."""
     buffer = BytesIO()
     doc = SimpleDocTemplate(
@@ -652,33 +1108,44 @@ def create_pdf_from_text(text: str, target_lang: str) -> str:
     doc.build(content, onFirstPage=add_page_number, onLaterPages=add_page_number)
     pdf_data = buffer.getvalue()
     buffer.close()
-    return base64.b64encode(pdf_data).decode("utf-8")
+    return pdf_data
 
 
-def report_agent(state: dict) -> dict:
-    """Generate PDF in memory (not saved to disk) and return Base64-encoded string."""
-    
-    english_pdf_base64 = create_pdf_for_state(state, "English")
-    
-    target_lang = state.get("language", "English")
-    report_text = generate_report_text(state, target_lang)
-    
-    if target_lang == "English":
-        pdf_base64 = english_pdf_base64
-    else:
-        pdf_base64 = create_pdf_for_state(state, target_lang)
+def render_report(english_document: ReportDocument, target_lang: str,
+                  on_text: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Translate an English report document and render it in memory (not saved to disk).
 
+    The document is translated once, then rendered to both the editable text and the PDF.
+    The PDF is laid out in a render worker process, so the CPU-bound layout does not hold the
+    GIL the server's request and progress stream threads need; meanwhile this thread renders
+    the markdown and passes it to ``on_text`` (the server stores it there). This is the only
+    language-specific stage, so every language of a topic can share one English research run.
+    """
+    document = translate_report_document(english_document, target_lang)
+
+    pdf_future = render_report_pdf_async(document)
+    report_text = render_report_markdown(document)
+    if on_text is not None:
+        on_text(report_text)
+    pdf_bytes = wait_for_pdf(pdf_future, document)
+
+    return {"pdf_bytes": pdf_bytes, "report_text": report_text}
+
+
+def report_agent(state: dict) -> dict:
+    """Generate the PDF bytes and report text from the graph state. The English document is
+    returned too, so chat can be indexed from it directly; no English PDF is rendered for
+    non-English reports."""
+    english_document = build_report_document(state)
     return {
-        "pdf_base64": pdf_base64,
-        "english_pdf_base64": english_pdf_base64,
-        "report_text": report_text
+        "english_document": english_document,
+        **render_report(english_document, state.get("language", "English")),
     }
 
 
 def conclusion_agent(state: GraphState) -> Dict[str, Any]:
     """Generate a concise conclusion summarizing the entire topic."""
-    combined_text = " ".join(state["summaries"].values())
-    language = state.get("language", "English")
+    combined_text = " ".join(state["summaries"][sub] for sub in ordered_subtopics(state))
     
     prompt = (
         f"Write a strong concluding paragraph (around 120–150 words) in English. "
@@ -686,30 +1153,92 @@ def conclusion_agent(state: GraphState) -> Dict[str, Any]:
         f"Summarize the key insights and future outlook for the topic '{state['topic']}'.\n"
         f"Here is the context:\n{combined_text[:2000]}"
     )
-    response = groq_llm.invoke(prompt)
-    conclusion_text = getattr(response, "content", str(response))
+    conclusion_text = invoke_llm(prompt)
     
     return {"conclusion": conclusion_text}
 
-graph = StateGraph(GraphState)
-graph.add_node("intro", intro_agent)
-graph.add_node("planner", planner_agent)
-graph.add_node("retriever", retriever_agent)
-graph.add_node("summarizer", summarizer_agent)
-graph.add_node("analyzer", analyzer_agent)
-graph.add_node("report_generator", report_agent)
-graph.add_node("conclusion", conclusion_agent)
-
-graph.add_edge(START, "intro")
-graph.add_edge("intro", "planner")
-graph.add_edge("planner", "retriever")
-graph.add_edge("retriever", "summarizer")
-graph.add_edge("summarizer", "analyzer")
-graph.add_edge("analyzer", "conclusion")
-graph.add_edge("conclusion", "report_generator")
-graph.add_edge("report_generator", END)
-
-app = graph.compile()
+def build_graph(pipeline_mode: str = PIPELINE_MODE, prompt_mode: str = PROMPT_MODE,
+                include_report: bool = True) -> StateGraph:
+    """Build the report workflow. The heading is generated once; intro and planner then run in
+    parallel (or come from one consolidated call), and conclusion waits for the intro and for
+    every subtopic's retrieve -> summarize -> analyze. Without ``include_report`` the graph
+    stops after the (English) conclusion, leaving translation and rendering to render_report."""
+    graph = StateGraph(GraphState)
+    graph.add_node("conclusion", conclusion_agent)
+
+    if prompt_mode == "consolidated":
+        graph.add_node("planner", outline_agent)
+        graph.add_edge(START, "planner")
+    else:
+        graph.add_node("heading", heading_agent)
+        graph.add_node("intro", intro_agent)
+        graph.add_node("planner", planner_agent)
+        graph.add_edge(START, "heading")
+        graph.add_edge("heading", "intro")
+        graph.add_edge("heading", "planner")
+
+    if pipeline_mode == "streaming":
+        graph.add_node("subtopic_pipeline", streaming_pipeline_agent)
+        graph.add_edge("planner", "subtopic_pipeline")
+    else:
+        graph.add_node("subtopic_pipeline", subtopic_agent)
+        graph.add_conditional_edges("planner", dispatch_subtopics, ["subtopic_pipeline"])
+
+    if prompt_mode == "consolidated":
+        graph.add_edge("subtopic_pipeline", "conclusion")
+    else:
+        graph.add_edge(["intro", "subtopic_pipeline"], "conclusion")
+    if include_report:
+        graph.add_node("report_generator", report_agent)
+        graph.add_edge("conclusion", "report_generator")
+        graph.add_edge("report_generator", END)
+    else:
+        graph.add_edge("conclusion", END)
+    return graph
+
+# Checkpoints are written after every node (and for each finished subtopic branch), keyed by
+# thread_id, so an interrupted run resumes from the last completed step instead of redoing
+# retrieval and summarization.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite3"))
+
+
+def create_checkpointer():
+    """SQLite checkpointer shared by all processes on the host; in-memory if the
+    langgraph-checkpoint-sqlite package is missing."""
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import MemorySaver
+        safe_print("⚠️ langgraph-checkpoint-sqlite not installed, report checkpoints are kept in memory only.")
+        return MemorySaver()
+    os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH), exist_ok=True)
+    saver = SqliteSaver(sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False, timeout=30))
+    saver.setup()
+    return saver
+
+
+def report_run_config(thread_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def pending_nodes(thread_id: str) -> tuple:
+    """Nodes an interrupted research run of ``thread_id`` would continue with; empty if there
+    is nothing to resume (no checkpoint, or the run finished)."""
+    return tuple(research_app.get_state(report_run_config(thread_id)).next)
+
+
+def clear_checkpoints(thread_id: str) -> None:
+    try:
+        checkpointer.delete_thread(thread_id)
+    except Exception as e:
+        safe_print(f"Could not delete checkpoints for '{thread_id}': {e}")
+
+
+graph = build_graph()
+checkpointer = create_checkpointer()
+app = graph.compile(checkpointer=checkpointer)
+# English research only (everything up to the conclusion), shared by all languages of a topic
+research_app = build_graph(include_report=False).compile(checkpointer=checkpointer)
 
 def rewrite_text(text: str, language: str) -> str:
     """Rewrite a portion of text using AI while preserving the target language."""
@@ -725,8 +1254,7 @@ def rewrite_text(text: str, language: str) -> str:
     )
     
     try:
-        response = groq_llm.invoke(prompt)
-        rewritten = getattr(response, "content", str(response)).strip()
+        rewritten = invoke_llm(prompt, priority=PRIORITY_INTERACTIVE, cache=False).strip()
         # Remove common AI prefix hallucinations
         rewritten = re.sub(r'^(Rewritten|Output|Result|Here is your text):\s*', '', rewritten, flags=re.IGNORECASE)
         rewritten = rewritten.strip(' "')
@@ -740,7 +1268,7 @@ if __name__ == "__main__":
     topic = input("Enter research topic: ").strip()
     final_state = None
 
-    for state in app.stream({"topic": topic}):
+    for state in app.stream({"topic": topic}, report_run_config(f"cli:{datetime.now().isoformat()}")):
         final_state = state
         if "report_generator" in state:
             print("\n📄 Report generation in progress...")
@@ -0,0 +1,338 @@
+import os
+import time
+import random
+import threading
+import itertools
+from queue import PriorityQueue
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterator, Optional
+from state_backend import StateBackend, get_state_backend
+from utils import safe_print
+
+# Lower numbers run first: chat and rewrite requests jump ahead of queued report prompts.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_REPORT = 10
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", "180"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "400"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an LLM request cannot be started or finished before its deadline."""
+
+
+def estimate_tokens(prompt: str, completion_tokens: int = LLM_COMPLETION_TOKENS) -> int:
+    """Rough token estimate (~4 characters per token) plus the expected completion size."""
+    return len(str(prompt)) // 4 + completion_tokens
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    message = str(e).lower()
+    return status == 429 or "rate limit" in message or "rate_limit" in message or "429" in message
+
+
+def is_retryable_error(e: Exception) -> bool:
+    if is_rate_limit_error(e):
+        return True
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    name = type(e).__name__.lower()
+    return "timeout" in name or "connection" in name or "overloaded" in str(e).lower()
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Read the Retry-After header from a provider error, if it carries one."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by every LLM call.
+
+    Both budgets are continuously refilling buckets holding up to one minute's worth. Their
+    levels live in the state backend, so with a shared backend every worker process on the
+    host (or every host, with Redis) draws from the one budget of the Groq plan instead of
+    each allowing the full limit.
+    """
+
+    namespace = "llm_rate_limit"
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 state: Optional[StateBackend] = None, key: str = "groq"):
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.state = state or get_state_backend()
+        self.key = key
+
+    def _refill(self, budget: Optional[Dict[str, float]], now: float) -> Dict[str, float]:
+        if budget is None:
+            return {"requests": self.requests_per_minute, "tokens": self.tokens_per_minute,
+                    "updated": now, "paused_until": 0.0}
+        elapsed = max(0.0, now - budget["updated"])
+        budget["requests"] = min(self.requests_per_minute,
+                                 budget["requests"] + elapsed * self.requests_per_minute / 60.0)
+        budget["tokens"] = min(self.tokens_per_minute,
+                               budget["tokens"] + elapsed * self.tokens_per_minute / 60.0)
+        budget["updated"] = now
+        return budget
+
+    def acquire(self, tokens: int) -> float:
+        """Wait until the budget admits a call of ``tokens`` and take it; returns seconds waited."""
+        tokens = min(tokens, self.tokens_per_minute)
+        started = time.time()
+        while True:
+            outcome = {}
+
+            def take(budget):
+                now = time.time()
+                budget = self._refill(budget, now)
+                wait = max(
+                    budget["paused_until"] - now,
+                    (1 - budget["requests"]) * 60.0 / self.requests_per_minute,
+                    (tokens - budget["tokens"]) * 60.0 / self.tokens_per_minute,
+                )
+                if wait <= 0:
+                    budget["requests"] -= 1
+                    budget["tokens"] -= tokens
+                outcome["wait"] = wait
+                return budget
+
+            self.state.mutate(self.namespace, self.key, take)
+            if outcome["wait"] <= 0:
+                return time.time() - started
+            time.sleep(min(outcome["wait"], 1.0))
+
+    def adjust(self, tokens: int) -> None:
+        """Correct the token budget once the real usage of a call is known."""
+        def correct(budget):
+            budget = self._refill(budget, time.time())
+            budget["tokens"] = min(self.tokens_per_minute, budget["tokens"] - tokens)
+            return budget
+
+        self.state.mutate(self.namespace, self.key, correct)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller after the provider reports a rate limit."""
+        def hold(budget):
+            budget = self._refill(budget, time.time())
+            budget["paused_until"] = max(budget["paused_until"], time.time() + seconds)
+            return budget
+
+        self.state.mutate(self.namespace, self.key, hold)
+
+
+class _Job:
+    def __init__(self, fn: Callable[[], Any], tokens: int, timeout: float):
+        self.fn = fn
+        self.tokens = tokens
+        self.timeout = timeout
+        self.future = Future()
+        # Set once the rate limiter has admitted the job; its timeout runs from here. The
+        # worker extends ``deadline`` by rate-limit waits between retries, and the caller
+        # waits on the same value.
+        self.admitted = threading.Event()
+        self.deadline = None
+        # Set by a caller that stopped waiting, so the worker does not retry for nobody
+        self.abandoned = threading.Event()
+
+
+class LLMScheduler:
+    """Process-wide priority queue in front of the LLM provider.
+
+    A fixed pool of workers bounds global concurrency, every call waits for rate-limit budget,
+    and rate-limit or transient errors are retried with jittered exponential backoff until the
+    request's deadline. The deadline only counts time spent calling the provider and backing
+    off: a burst of queued report prompts waits its turn instead of timing out in the queue.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 requests_per_minute: int = GROQ_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = GROQ_TOKENS_PER_MINUTE,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.queue = PriorityQueue()
+        self.sequence = itertools.count()
+        self.stats_lock = threading.Lock()
+        self.counters = {"submitted": 0, "completed": 0, "failed": 0, "retries": 0,
+                         "rate_limited": 0, "deadline_exceeded": 0, "running": 0}
+        self.workers = []
+        self.start_lock = threading.Lock()
+
+    def _count(self, name: str, delta: int = 1) -> None:
+        with self.stats_lock:
+            self.counters[name] += delta
+
+    def _ensure_workers(self) -> None:
+        if self.workers:
+            return
+        with self.start_lock:
+            if self.workers:
+                return
+            for i in range(self.max_concurrency):
+                t = threading.Thread(target=self._worker, name=f"llm-scheduler-{i}", daemon=True)
+                t.start()
+                self.workers.append(t)
+
+    def _worker(self) -> None:
+        while True:
+            _, _, job = self.queue.get()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self._count("running")
+            try:
+                job.future.set_result(self._run(job))
+                self._count("completed")
+            except BaseException as e:
+                if isinstance(e, DeadlineExceeded):
+                    self._count("deadline_exceeded")
+                self._count("failed")
+                job.future.set_exception(e)
+            finally:
+                self._count("running", -1)
+
+    def _backoff(self, attempt: int, e: Exception, deadline: float) -> None:
+        delay = retry_after_seconds(e)
+        if delay is None:
+            delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+        if is_rate_limit_error(e):
+            self._count("rate_limited")
+            self.limiter.pause(delay)
+        if time.monotonic() + delay > deadline:
+            raise DeadlineExceeded(f"LLM request retries exhausted the deadline: {e}") from e
+        self._count("retries")
+        safe_print(f"LLM call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        time.sleep(delay)
+
+    def _adjust_usage(self, result: Any, tokens: int) -> None:
+        usage = getattr(result, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.limiter.adjust(usage["total_tokens"] - tokens)
+
+    def _run(self, job: _Job) -> Any:
+        attempt = 0
+        while True:
+            if job.abandoned.is_set():
+                raise DeadlineExceeded("LLM request abandoned by its caller")
+            waited = self.limiter.acquire(job.tokens)
+            if job.deadline is None:
+                job.deadline = time.monotonic() + job.timeout
+                job.admitted.set()
+            else:
+                job.deadline += waited
+            try:
+                result = job.fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                self._backoff(attempt, e, job.deadline)
+                attempt += 1
+                continue
+            self._adjust_usage(result, job.tokens)
+            return result
+
+    def _submit(self, fn: Callable[[], Any], tokens: int, priority: int, timeout: float) -> _Job:
+        self._ensure_workers()
+        job = _Job(fn, tokens, timeout)
+        self._count("submitted")
+        self.queue.put((priority, next(self.sequence), job))
+        return job
+
+    def submit(self, fn: Callable[[], Any], tokens: int, priority: int = PRIORITY_REPORT,
+               timeout: float = LLM_REQUEST_DEADLINE) -> Future:
+        """Queue a provider call; the returned future resolves with its result. ``timeout``
+        starts once the rate limiter admits the call."""
+        return self._submit(fn, tokens, priority, timeout).future
+
+    def invoke(self, llm, prompt: str, priority: int = PRIORITY_REPORT,
+               timeout: float = LLM_REQUEST_DEADLINE) -> Any:
+        """Blocking llm.invoke(prompt) that goes through the shared queue and rate limiter."""
+        job = self._submit(lambda: llm.invoke(prompt), estimate_tokens(prompt), priority, timeout)
+        # Waiting in the queue and for rate-limit budget does not count against the timeout
+        while not job.admitted.wait(1.0):
+            if job.future.done():
+                return job.future.result()
+        while True:
+            try:
+                return job.future.result(timeout=max(0.0, job.deadline - time.monotonic()))
+            except FutureTimeout as e:
+                if time.monotonic() < job.deadline:
+                    continue  # the worker extended the deadline while waiting for budget
+                job.abandoned.set()
+                raise DeadlineExceeded(f"LLM request did not finish within {timeout:.0f}s") from e
+
+    def stream(self, llm, prompt: str, priority: int = PRIORITY_REPORT,
+               timeout: float = LLM_REQUEST_DEADLINE) -> Iterator[Any]:
+        """llm.stream(prompt) that holds one worker slot for the duration of the stream.
+
+        A worker picks up a placeholder job in priority order, after the rate limiter has
+        admitted it, and keeps its slot until the caller finishes consuming the stream. Retries
+        take rate-limit budget again, and the token budget is corrected from the usage reported
+        with the final chunk.
+        """
+        granted = threading.Event()
+        released = threading.Event()
+
+        def hold_slot():
+            granted.set()
+            released.wait()
+
+        tokens = estimate_tokens(prompt)
+        future = self.submit(hold_slot, tokens, priority, timeout)
+        try:
+            while not granted.wait(0.1):
+                if future.done():
+                    future.result()
+
+            deadline = time.monotonic() + timeout
+            attempt = 0
+            while True:
+                started = False
+                last = None
+                try:
+                    for chunk in llm.stream(prompt):
+                        started = True
+                        last = chunk
+                        yield chunk
+                    self._adjust_usage(last, tokens)
+                    return
+                except Exception as e:
+                    if started or attempt >= self.max_retries or not is_retryable_error(e):
+                        raise
+                    self._backoff(attempt, e, deadline)
+                    attempt += 1
+                    deadline += self.limiter.acquire(tokens)
+        finally:
+            released.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.stats_lock:
+            stats = dict(self.counters)
+        stats["queued"] = self.queue.qsize()
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler shared by report agents and chat."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
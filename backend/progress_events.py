@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+from state_backend import StateBackend
+
+PROGRESS_EVENT_LIMIT = int(os.getenv("PROGRESS_EVENT_LIMIT", "500"))
+# How often subscribers check the state backend for events published by other workers
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "0.5"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# Each open stream holds a server thread; streams past this many per process get a 503
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "8"))
+
+# Share of the total run time each stage usually takes, used for the ETA
+STAGE_WEIGHTS = {"planning": 0.1, "subtopics": 0.65, "conclusion": 0.05, "report": 0.2}
+PLANNING_NODES = ("heading", "intro", "planner")
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def is_terminal(event: Dict[str, Any]) -> bool:
+    return event["event"] == "status" and event["data"].get("status") in ("completed", "failed")
+
+
+class ProgressEvents:
+    """Per-report event log kept in the state backend, streamed to clients over SSE.
+
+    Events are appended as one log entry each, so publishing and catching up only touch the
+    new events. Ids increase monotonically per report (also across runs), so a reconnecting
+    client resumes after its ``Last-Event-ID``. Subscribers of a report in the publishing
+    process are woken immediately; with a shared backend they also check for events from
+    other workers every ``PROGRESS_POLL_INTERVAL``. Section bodies are stored next to the log
+    and only referenced by their events, see ``publish_section``.
+    """
+
+    namespace = "report_events"
+    sections_namespace = "report_sections"
+
+    def __init__(self, state: StateBackend, ttl: Optional[float] = None, limit: int = PROGRESS_EVENT_LIMIT,
+                 max_streams: int = SSE_MAX_STREAMS):
+        self.state = state
+        self.ttl = ttl
+        self.limit = limit
+        # report key -> [condition, subscriber count, publish count]; a publish wakes only that
+        # report's streams
+        self.conditions: Dict[str, list] = {}
+        self.lock = threading.Lock()
+        self.streams = threading.BoundedSemaphore(max_streams)
+
+    def _notify(self, key: str) -> None:
+        with self.lock:
+            entry = self.conditions.get(key)
+        if entry is not None:
+            with entry[0]:
+                entry[2] += 1
+                entry[0].notify_all()
+
+    def _watch(self, key: str) -> list:
+        with self.lock:
+            entry = self.conditions.setdefault(key, [threading.Condition(), 0, 0])
+            entry[1] += 1
+            return entry
+
+    def _unwatch(self, key: str) -> None:
+        with self.lock:
+            entry = self.conditions[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.conditions[key]
+
+    def reset(self, key: str) -> None:
+        """Drop the events of a previous run, keeping the id sequence."""
+        self.state.clear_log(self.namespace, key)
+        self._notify(key)
+
+    def publish(self, key: str, event: str, data: Dict[str, Any]) -> int:
+        seq = self.state.append(self.namespace, key, {"event": event, "data": data}, ttl=self.ttl, keep=self.limit)
+        self._notify(key)
+        return seq
+
+    def publish_section(self, key: str, kind: str, order: int, markdown: str) -> int:
+        """Store a rendered part of the report and publish a "section" event referring to it;
+        clients fetch the markdown by its ``order`` (see ``section``)."""
+        self.state.set(self.sections_namespace, f"{key}:{order}", {"kind": kind, "markdown": markdown},
+                       ttl=self.ttl)
+        return self.publish(key, "section", {"kind": kind, "order": order})
+
+    def section(self, key: str, order: int) -> Optional[Dict[str, Any]]:
+        return self.state.get(self.sections_namespace, f"{key}:{order}")
+
+    def since(self, key: str, last_id: int = 0) -> List[Dict[str, Any]]:
+        return [{"id": entry_id, **entry} for entry_id, entry in self.state.read_log(self.namespace, key, last_id)]
+
+    def open_stream(self) -> bool:
+        """Reserve one of the ``SSE_MAX_STREAMS`` stream slots; pair with ``close_stream``."""
+        return self.streams.acquire(blocking=False)
+
+    def close_stream(self) -> None:
+        self.streams.release()
+
+    def subscribe(self, key: str, last_id: int = 0, snapshot: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield SSE frames for the events after ``last_id`` until the run completes or fails.
+
+        ``snapshot`` is sent first (without an id) so a late subscriber starts from the
+        current state; if that is already terminal, the stream ends there.
+        """
+        if snapshot is not None:
+            first = {"id": None, "event": "status", "data": snapshot}
+            yield format_sse(first)
+            if is_terminal(first):
+                return
+
+        # Without a shared backend every event is published in this process and wakes us
+        wait = PROGRESS_POLL_INTERVAL if self.state.shared else SSE_KEEPALIVE_SECONDS
+        watch = self._watch(key)
+        changed = watch[0]
+        try:
+            idle_since = time.time()
+            while True:
+                with changed:
+                    published = watch[2]
+                events = self.since(key, last_id)
+                for event in events:
+                    last_id = event["id"]
+                    yield format_sse(event)
+                    if is_terminal(event):
+                        return
+                if events:
+                    idle_since = time.time()
+                elif time.time() - idle_since > SSE_KEEPALIVE_SECONDS:
+                    idle_since = time.time()
+                    yield ": keepalive\n\n"
+                with changed:
+                    # Skip the wait if something was published while we were reading
+                    if watch[2] == published:
+                        changed.wait(wait)
+        finally:
+            self._unwatch(key)
+
+
+class RunProgress:
+    """Tracks how far a report run is, to attach subtopic counts and an ETA to its events."""
+
+    def __init__(self, total_subtopics: int = 0, done_subtopics=(), done_stages=()):
+        self.started = time.time()
+        self.total_subtopics = total_subtopics
+        self.done_subtopics = set(done_subtopics)
+        self.done_stages = set(done_stages)
+        # Work finished before a resumed run started does not count towards its speed
+        self.baseline = self.fraction()
+
+    def finish(self, node: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a finished node and return progress details for its event."""
+        if node in PLANNING_NODES:
+            if "subtopics" in result:
+                self.total_subtopics = len(result["subtopics"])
+                self.done_stages.add("planning")
+        elif node == "subtopic_pipeline":
+            self.done_subtopics.update((result.get("content") or {}).keys())
+        elif node == "conclusion":
+            self.done_stages.update(("planning", "subtopics", "conclusion"))
+        elif node == "report_generator":
+            self.done_stages.update(STAGE_WEIGHTS)
+        return self.details()
+
+    def fraction(self) -> float:
+        done = sum(STAGE_WEIGHTS[stage] for stage in self.done_stages)
+        if "subtopics" not in self.done_stages and self.total_subtopics:
+            done += STAGE_WEIGHTS["subtopics"] * min(1.0, len(self.done_subtopics) / self.total_subtopics)
+        return min(1.0, done)
+
+    def eta_seconds(self) -> Optional[float]:
+        progressed = self.fraction() - self.baseline
+        if progressed <= 0.05:
+            return None
+        elapsed = time.time() - self.started
+        return round(elapsed * (1.0 - self.fraction()) / progressed, 1)
+
+    def details(self) -> Dict[str, Any]:
+        return {
+            "subtopics_done": len(self.done_subtopics),
+            "subtopics_total": self.total_subtopics,
+            "fraction": round(self.fraction(), 3),
+            "eta_seconds": self.eta_seconds(),
+        }
@@ -1,74 +1,356 @@
 import os
+import math
+import time
 import threading
 import base64
-from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
+from io import BytesIO
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-from lang import app, rewrite_text, safe_print
-from chat_handler import init_chat_from_base64, chat_with_pdf, chat_with_pdf_stream
+from concurrent.futures import ThreadPoolExecutor
+from lang import (research_app, rewrite_text, llm_cache, subtopic_cache, search_stats, get_render_pool,
+                  report_run_config, pending_nodes, clear_checkpoints, preview_report_markdown,
+                  build_report_document, render_report)
+
+# Fork the PDF render workers before the embedding model, scheduler or request threads start.
+get_render_pool()
+
+from chat_handler import init_chat_from_pdf, init_chat_from_report, chat_with_pdf, chat_with_pdf_stream, chat_sessions
+from llm_scheduler import get_scheduler
+from translation_memory import translation_stats
+from artifact_store import ReportArtifactStore
+from state_backend import get_state_backend
+from job_queue import JobQueue, QueueFull
+from progress_events import ProgressEvents, RunProgress
+from utils import safe_print
 
 
 server = Flask(__name__, static_folder="build", static_url_path="/")
 CORS(server)
 
-progress_state = {}
-generated_reports = {}
-generated_report_texts = {}
-generated_english_reports = {}
-generation_status = {}
+# Progress and generation status live in the state backend so every worker sees them;
+# records expire after STATE_TTL seconds so a shared backend does not grow forever.
+state = get_state_backend()
+STATE_TTL = float(os.getenv("STATE_TTL", "86400"))
+# PDFs, report texts and English report documents, as raw bytes in a bounded store
+report_store = ReportArtifactStore()
+
+PROGRESS_STEPS = ("topicAnalysis", "dataGathering", "draftingReport", "finalizing")
+
+
+# Pushed to clients over SSE as the run advances (see /api/progress/<cache_key>/events)
+events = ProgressEvents(state, ttl=STATE_TTL)
+
+
+def set_progress(cache_key, **flags):
+    progress = state.update("progress", cache_key, flags, ttl=STATE_TTL)
+    events.publish(cache_key, "progress", progress)
+
+
+def get_progress_flags(cache_key):
+    return state.get("progress", cache_key) or {step: False for step in PROGRESS_STEPS}
+
+
+def set_generation_status(cache_key, status, **details):
+    state.set("generation_status", cache_key, status, ttl=STATE_TTL)
+    events.publish(cache_key, "status", {"status": status, **details})
+
+
+def get_generation_status(cache_key):
+    return state.get("generation_status", cache_key, "not_started")
+
+
+# Steps already done when a checkpointed run resumes at a given node
+RESUMED_PROGRESS = {
+    "subtopic_pipeline": ("topicAnalysis",),
+    "conclusion": ("topicAnalysis", "dataGathering"),
+}
+RESUMED_STAGES = {
+    "subtopic_pipeline": ("planning",),
+    "conclusion": ("planning", "subtopics"),
+}
+RESEARCH_STEPS = ("topicAnalysis", "dataGathering", "draftingReport")
+# Progress step a finished node completes
+NODE_PROGRESS = {
+    "heading": "topicAnalysis",
+    "intro": "topicAnalysis",
+    "planner": "topicAnalysis",
+    "subtopic_pipeline": "dataGathering",
+    "conclusion": "draftingReport",
+}
+
+
+# Sections are pushed as markdown "section" events as soon as their nodes finish
+REPORT_PREVIEW = os.getenv("REPORT_PREVIEW", "1") != "0"
+REPORT_PREVIEW_WORKERS = int(os.getenv("REPORT_PREVIEW_WORKERS", "2"))
+CONCLUSION_ORDER = 10000
+
+
+def publish_preview(cache_key, language, kind, order, partial_state, number=1):
+    """Translate and render one part of the report and publish it as a section event."""
+    try:
+        markdown = preview_report_markdown(partial_state, language, number)
+    except Exception as e:
+        safe_print(f"Preview of {kind} for '{cache_key}' failed: {e}")
+        return
+    if markdown:
+        events.publish_section(cache_key, kind, order, markdown)
+
+
+def schedule_previews(executor, cache_key, language, node, result, subtopics):
+    """Queue previews for whatever a finished node produced. Translation runs on the preview
+    executor so it never holds up the graph."""
+    if result.get("heading"):
+        executor.submit(publish_preview, cache_key, language, "title", 0, {"heading": result["heading"]})
+    if result.get("intro"):
+        executor.submit(publish_preview, cache_key, language, "intro", 1, {"intro": result["intro"]})
+    if node == "subtopic_pipeline":
+        summaries = result.get("summaries") or {}
+        insights = result.get("insights") or {}
+        for sub, summary in summaries.items():
+            position = subtopics.index(sub) if sub in subtopics else len(subtopics)
+            partial = {"summaries": {sub: summary}, "insights": {sub: insights.get(sub, "")}}
+            executor.submit(publish_preview, cache_key, language, "subtopic", 2 + position, partial, position + 1)
+    if result.get("conclusion"):
+        executor.submit(publish_preview, cache_key, language, "conclusion", CONCLUSION_ORDER,
+                        {"conclusion": result["conclusion"]})
+
+
+def node_started(cache_key, task):
+    """Publish a node start from a LangGraph debug "task" event."""
+    event = {"node": task["name"], "phase": "start"}
+    task_input = task.get("input")
+    if isinstance(task_input, dict) and task_input.get("subtopic"):
+        event["subtopic"] = task_input["subtopic"]
+    events.publish(cache_key, "node", event)
+
+
+# The English research behind a report (everything up to the conclusion) is shared by all
+# languages of a topic: it is cached per (topic, pages), and concurrent runs for other
+# languages wait for the run holding the research lease instead of researching again.
+RESEARCH_CACHE_TTL = float(os.getenv("RESEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+# A lease not renewed for this long belongs to a run that died; another run takes over. The
+# holder renews it from a heartbeat thread, so long graph nodes do not let it lapse.
+RESEARCH_LEASE_TTL = float(os.getenv("RESEARCH_LEASE_TTL", "300"))
+RESEARCH_WAIT_INTERVAL = 1.0
+
+
+class ResearchLeaseLost(Exception):
+    """Raised in a research run whose lease was taken over by another run."""
+
+
+def create_research_key(topic, pages):
+    return f"{topic}||{pages}"
+
+
+def lease_live(lease):
+    # Expiry is part of the value, so claims and renewals decide on it atomically
+    return bool(lease) and lease["expires_at"] > time.time()
+
+
+def claim_research(research_key, cache_key):
+    """Take the research lease for ``research_key``. Returns None if this run holds it, else
+    the cache key of the run that does."""
+    lease = state.get("research_leases", research_key)
+    if lease_live(lease) and lease["owner"] != cache_key:
+        return lease["owner"]
+
+    def claim(current):
+        if lease_live(current) and current["owner"] != cache_key:
+            return current
+        return {"owner": cache_key, "expires_at": time.time() + RESEARCH_LEASE_TTL}
+
+    lease = state.mutate("research_leases", research_key, claim, ttl=RESEARCH_LEASE_TTL)
+    return None if lease["owner"] == cache_key else lease["owner"]
+
+
+def renew_research(research_key, cache_key):
+    """Extend the lease if this run still holds it; returns whether it does."""
+    def renew(current):
+        if current and current["owner"] == cache_key:
+            return {"owner": cache_key, "expires_at": time.time() + RESEARCH_LEASE_TTL}
+        return current
+
+    lease = state.mutate("research_leases", research_key, renew, ttl=RESEARCH_LEASE_TTL)
+    return bool(lease) and lease["owner"] == cache_key
+
+
+def release_research(research_key, cache_key):
+    def release(current):
+        if current and current["owner"] == cache_key:
+            return {**current, "expires_at": 0}
+        return current
+
+    state.mutate("research_leases", research_key, release, ttl=RESEARCH_LEASE_TTL)
+
+
+def hold_research_lease(research_key, cache_key, stop, lost):
+    """Heartbeat renewing the lease until ``stop`` is set; sets ``lost`` if it was taken over."""
+    while not stop.wait(RESEARCH_LEASE_TTL / 3):
+        try:
+            if not renew_research(research_key, cache_key):
+                safe_print(f"Research lease for '{research_key}' was taken over from '{cache_key}'")
+                lost.set()
+                return
+        except Exception as e:
+            safe_print(f"Could not renew research lease for '{research_key}': {e}")
+
+
+def wait_for_research(cache_key, research_key, owner, progress):
+    """Wait for the run holding the research lease, mirroring its progress. Returns the English
+    document, or None if that run gave up without producing one."""
+    safe_print(f"Report '{cache_key}' is waiting for research shared with '{owner}'")
+    events.publish(cache_key, "node", {"node": "research", "phase": "waiting", "shared_with": owner})
+    while True:
+        english_document = report_store.get_json(research_key, "english_document")
+        if english_document is not None:
+            return english_document
+        lease = state.get("research_leases", research_key)
+        if not lease_live(lease):
+            return None
+        owner_progress = get_progress_flags(lease["owner"])
+        done = {step: True for step in RESEARCH_STEPS if owner_progress.get(step) and not progress[step]}
+        if done:
+            progress.update(done)
+            set_progress(cache_key, **done)
+        time.sleep(RESEARCH_WAIT_INTERVAL)
+
+
+def run_research(cache_key, research_key, topic, language, pages, progress, run, previews, lease_lost):
+    """Run (or resume) the English research graph for a report and cache its document.
+
+    The graph checkpoints under the research key, so a run that failed or was interrupted
+    continues from its last completed node, whichever language picks it up again. Node starts
+    and finishes, finished subtopics and an ETA are published as progress events, and (with
+    REPORT_PREVIEW) each finished part of the report as a markdown section in ``language``.
+    Raises ResearchLeaseLost once ``lease_lost`` is set.
+    """
+    config = report_run_config(research_key)
+    resume_at = pending_nodes(research_key)
+    subtopics = []
+    if resume_at:
+        safe_print(f"Resuming research '{research_key}' at {', '.join(resume_at)}")
+        values = research_app.get_state(config).values
+        subtopics = list(values.get("subtopics", []))
+        run.total_subtopics = len(subtopics)
+        run.done_subtopics.update((values.get("content") or {}).keys())
+        run.done_stages.update(stage for node in resume_at for stage in RESUMED_STAGES.get(node, ()))
+        run.baseline = run.fraction()
+        done = {step: True for node in resume_at for step in RESUMED_PROGRESS.get(node, ())}
+        progress.update(done)
+        set_progress(cache_key, **done)
+        inputs = None
+    else:
+        clear_checkpoints(research_key)
+        inputs = {"topic": topic, "pages": pages}
+
+    for mode, chunk in research_app.stream(inputs, config, stream_mode=["updates", "debug"]):
+        if mode == "debug":
+            if chunk.get("type") == "task":
+                node_started(cache_key, chunk["payload"])
+            continue
+
+        if lease_lost.is_set():
+            raise ResearchLeaseLost(research_key)
+        for node, result in chunk.items():
+            result = result or {}
+            if result.get("subtopics"):
+                subtopics = list(result["subtopics"])
+            if REPORT_PREVIEW:
+                schedule_previews(previews, cache_key, language, node, result, subtopics)
+            details = run.finish(node, result)
+            events.publish(cache_key, "node", {"node": node, "phase": "finish", **details})
+            if node == "subtopic_pipeline":
+                for subtopic in (result.get("content") or {}):
+                    events.publish(cache_key, "subtopic", {"subtopic": subtopic, **details})
+            if node in NODE_PROGRESS and not progress[NODE_PROGRESS[node]]:
+                progress[NODE_PROGRESS[node]] = True
+                set_progress(cache_key, **{NODE_PROGRESS[node]: True})
+
+    english_document = build_report_document(research_app.get_state(config).values)
+    report_store.put_json(research_key, "english_document", english_document, ttl=RESEARCH_CACHE_TTL)
+    safe_print(f"Storing English report document for topic: '{topic}'")
+    report_store.put_json(topic, "english_document", english_document)
+    clear_checkpoints(research_key)
+    return english_document
+
+
+def obtain_research(cache_key, topic, language, pages, progress, run, previews):
+    """English report document for (topic, pages): cached, produced by a concurrent run for
+    another language, or researched by this run."""
+    research_key = create_research_key(topic, pages)
+    while True:
+        english_document = report_store.get_json(research_key, "english_document")
+        if english_document is not None:
+            safe_print(f"Reusing English research for '{research_key}'")
+            return english_document
+
+        owner = claim_research(research_key, cache_key)
+        if owner is None:
+            stop, lost = threading.Event(), threading.Event()
+            threading.Thread(target=hold_research_lease, args=(research_key, cache_key, stop, lost),
+                             name="research-lease", daemon=True).start()
+            try:
+                return run_research(cache_key, research_key, topic, language, pages, progress, run,
+                                    previews, lost)
+            except ResearchLeaseLost:
+                # Another run is doing this research now; wait for it like any other run
+                continue
+            finally:
+                stop.set()
+                release_research(research_key, cache_key)
+
+        english_document = wait_for_research(cache_key, research_key, owner, progress)
+        if english_document is not None:
+            return english_document
+
 
 def background_generate(cache_key, topic, language="English", pages=3):
-    """Run LangGraph workflow in a background thread."""
+    """Produce a report on a report worker thread: obtain the English research, then
+    translate and render it. Failures are recorded in the progress state and re-raised so
+    the job is marked failed."""
+    previews = ThreadPoolExecutor(max_workers=REPORT_PREVIEW_WORKERS, thread_name_prefix="report-preview")
     try:
-        generation_status[cache_key] = "in_progress"
-
-        for state in app.stream({"topic": topic, "language": language, "pages": pages}):
-            if "intro" in state or "planner" in state:
-                progress_state[cache_key]["topicAnalysis"] = True
-            elif "retriever" in state:
-                progress_state[cache_key]["dataGathering"] = True
-            elif "summarizer" in state or "analyzer" in state or "conclusion" in state:
-                progress_state[cache_key]["draftingReport"] = True
-            elif "visualizer" in state or "report_generator" in state:
-                progress_state[cache_key]["finalizing"] = True
-
-            if "report_generator" in state:
-                pdf_base64 = state["report_generator"].get("pdf_base64")
-                english_pdf_base64 = state["report_generator"].get("english_pdf_base64")
-                report_text = state["report_generator"].get("report_text")
-                
-                if pdf_base64:
-                    generated_reports[cache_key] = pdf_base64
-                    if report_text:
-                        generated_report_texts[cache_key] = report_text
-                    if english_pdf_base64:
-                        safe_print(f"Storing English PDF for topic: '{topic}'")
-                        generated_english_reports[topic] = english_pdf_base64
-                    else:
-                        safe_print(f"No English PDF returned for topic: '{topic}'")
-                    
-                    generation_status[cache_key] = "completed"
-                break
-
-        progress_state[cache_key] = {
-            "topicAnalysis": True,
-            "dataGathering": True,
-            "draftingReport": True,
-            "finalizing": True,
-        }
-
-        if cache_key not in generation_status or generation_status[cache_key] != "completed":
-            generation_status[cache_key] = "completed"
+        progress = {step: False for step in PROGRESS_STEPS}
+        run = RunProgress()
+        state.set("progress", cache_key, progress, ttl=STATE_TTL)
+        set_generation_status(cache_key, "in_progress")
+        events.publish(cache_key, "progress", progress)
+
+        english_document = obtain_research(cache_key, topic, language, pages, progress, run, previews)
+        set_progress(cache_key, **{step: True for step in RESEARCH_STEPS})
+        run.done_stages.update(("planning", "subtopics", "conclusion"))
+
+        events.publish(cache_key, "node", {"node": "report_generator", "phase": "start"})
+        # The report text is stored while the PDF is still rendering
+        report = render_report(english_document, language,
+                               on_text=lambda text: report_store.put_text(cache_key, "text", text))
+        events.publish(cache_key, "node", {"node": "report_generator", "phase": "finish",
+                                           **run.finish("report_generator", {})})
+
+        report_store.put(cache_key, "pdf", report["pdf_bytes"])
+
+        set_progress(cache_key, **{step: True for step in PROGRESS_STEPS})
+        set_generation_status(cache_key, "completed")
 
     except Exception as e:
         safe_print(f"[ERROR] Background generation failed for {topic} (pages={pages}, lang={language}): {e}")
-        progress_state[cache_key] = {
-            "topicAnalysis": False,
-            "dataGathering": False,
-            "draftingReport": False,
-            "finalizing": False,
-            "error": str(e)
-        }
-        generation_status[cache_key] = "failed"
+        set_progress(cache_key, **{step: False for step in PROGRESS_STEPS}, error=str(e))
+        set_generation_status(cache_key, "failed", error=str(e))
+        raise
+    finally:
+        # Previews still waiting are moot once the report is done
+        previews.shutdown(wait=False, cancel_futures=True)
+
+
+def run_report_job(job):
+    payload = job["payload"]
+    background_generate(job["key"], payload["topic"], payload["language"], payload["pages"])
+
+
+# Report generation runs on a fixed pool of worker threads fed by a persistent queue, so
+# bursts wait their turn instead of starting a graph each, and jobs survive restarts.
+report_jobs = JobQueue(run_report_job)
+report_jobs.start()
 
 
 def create_report_key(topic, language, pages):
@@ -101,25 +383,37 @@ def generate_report():
 
         cache_key = create_report_key(topic, language, pages)
 
-        if cache_key in generated_reports:
-            return jsonify({"pdf_base64": generated_reports[cache_key]})
-
-        if cache_key in generation_status and generation_status[cache_key] == "in_progress":
-            return jsonify({"message": "Report generation already in progress"})
-
-        progress_state[cache_key] = {
-            "topicAnalysis": False,
-            "dataGathering": False,
-            "draftingReport": False,
-            "finalizing": False,
-        }
-        generation_status[cache_key] = "in_progress"
-
-        thread = threading.Thread(target=background_generate, args=(cache_key, topic, language, pages))
-        thread.daemon = True
-        thread.start()
-
-        return jsonify({"message": "Report generation started", "topic": topic})
+        pdf_bytes = report_store.get(cache_key, "pdf")
+        if pdf_bytes:
+            return jsonify({
+                "pdf_base64": base64.b64encode(pdf_bytes).decode("utf-8"),
+                "report_text": report_store.get_text(cache_key, "text") or "",
+            })
+
+        def announce(job, position):
+            # Runs before a worker can pick the job up, so the events of a previous run are
+            # gone before this run publishes any
+            state.set("generation_status", cache_key, "queued", ttl=STATE_TTL)
+            state.set("progress", cache_key, {step: False for step in PROGRESS_STEPS}, ttl=STATE_TTL)
+            events.reset(cache_key)
+            events.publish(cache_key, "status", {"status": "queued", "job_id": job["id"],
+                                                 "queue_position": position})
+
+        try:
+            job, created = report_jobs.submit(cache_key, {"topic": topic, "language": language, "pages": pages},
+                                              on_created=announce)
+        except QueueFull as e:
+            retry_after = math.ceil(e.retry_after)
+            response = jsonify({"error": "Server is busy generating other reports, please retry shortly",
+                                "retry_after": retry_after})
+            response.status_code = 429
+            response.headers["Retry-After"] = str(retry_after)
+            return response
+
+        if not created:
+            return jsonify({"message": "Report generation already in progress", "job_id": job["id"]})
+
+        return jsonify({"message": "Report generation started", "topic": topic, "job_id": job["id"]})
     except Exception as e:
         import traceback
         safe_print("Error in generate_report:")
@@ -130,13 +424,8 @@ def generate_report():
 @server.route("/api/progress/<cache_key>", methods=["GET"])
 def get_progress(cache_key):
     """Return current progress for frontend polling."""
-    status = generation_status.get(cache_key, "not_started")
-    progress = progress_state.get(cache_key, {
-        "topicAnalysis": False,
-        "dataGathering": False,
-        "draftingReport": False,
-        "finalizing": False,
-    })
+    status = get_generation_status(cache_key)
+    progress = get_progress_flags(cache_key)
     return jsonify({
         "progress": progress,
         "status": status,
@@ -144,43 +433,111 @@ def get_progress(cache_key):
     })
 
 
+@server.route("/api/progress/<cache_key>/events", methods=["GET"])
+def progress_events(cache_key):
+    """Stream progress events for a report as Server-Sent Events until it completes or fails.
+
+    The first event is a snapshot of the current status and progress; reconnecting clients
+    (EventSource sends Last-Event-ID) continue after the last event they received. Every
+    stream holds a server thread, so past SSE_MAX_STREAMS open streams this answers 503 and
+    clients fall back to polling /api/progress/<cache_key>.
+    """
+    if not events.open_stream():
+        response = jsonify({"error": "Too many open progress streams, poll /api/progress instead"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    try:
+        try:
+            last_id = int(request.headers.get("Last-Event-ID") or request.args.get("since") or 0)
+        except ValueError:
+            last_id = 0
+        status = get_generation_status(cache_key)
+        if status == "not_started" and report_store.has(cache_key, "pdf"):
+            status = "completed"
+        snapshot = {"status": status, "progress": get_progress_flags(cache_key), "snapshot": True}
+
+        response = Response(stream_with_context(events.subscribe(cache_key, last_id, snapshot)),
+                            mimetype="text/event-stream")
+    except BaseException:
+        events.close_stream()
+        raise
+    # Runs when the server closes the response, also if the client went away before it started
+    response.call_on_close(events.close_stream)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@server.route("/api/progress/<cache_key>/sections/<int:order>", methods=["GET"])
+def progress_section(cache_key, order):
+    """Return the markdown of a preview section announced by a "section" event."""
+    section = events.section(cache_key, order)
+    if section is None:
+        return jsonify({"error": "Section not found"}), 404
+    response = jsonify({"order": order, **section})
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@server.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return the state of a report generation job."""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "cache_key": job["key"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "queue_position": report_jobs.position(job) if job["status"] == "queued" else 0,
+        "error": job["error"],
+    })
+
+
 @server.route("/api/report/<cache_key>", methods=["GET"])
 def get_report(cache_key):
     """Return generated PDF (Base64) for display."""
-    if cache_key not in generated_reports:
+    pdf_data = report_store.get(cache_key, "pdf")
+    if pdf_data is None:
         return jsonify({"error": "Report not found"}), 404
 
-    pdf_data = generated_reports.get(cache_key)
     if not pdf_data:
         return jsonify({"error": "PDF data is empty"}), 404
 
     return jsonify({
-        "pdf_base64": pdf_data,
-        "report_text": generated_report_texts.get(cache_key, ""),
+        "pdf_base64": base64.b64encode(pdf_data).decode("utf-8"),
+        "report_text": report_store.get_text(cache_key, "text") or "",
         "status": "success"
     })
 
 
 @server.route("/api/report/view/<cache_key>", methods=["GET"])
 def view_report_pdf(cache_key):
-    """Serve the generated PDF directly for browser viewing."""
-    if cache_key not in generated_reports:
+    """Serve the generated PDF directly for browser viewing.
+
+    The stored bytes are sent as-is, with the content digest as ETag so browsers can
+    revalidate, and Range support so PDF viewers can fetch pages incrementally.
+    """
+    pdf_bytes = report_store.get(cache_key, "pdf")
+    if pdf_bytes is None:
         return "Report not found", 404
 
     try:
-        pdf_base64 = generated_reports[cache_key]
-        pdf_bytes = base64.b64decode(pdf_base64)
-        
         filename = cache_key.split("||")[0] if "||" in cache_key else "report"
-        
-        return Response(
-            pdf_bytes,
+
+        response = send_file(
+            BytesIO(pdf_bytes),
             mimetype="application/pdf",
-            headers={
-                "Content-Type": "application/pdf",
-                "Content-Disposition": f"inline; filename=\"{filename}.pdf\""
-            }
+            as_attachment=False,
+            download_name=f"{filename}.pdf",
+            conditional=True,
+            etag=report_store.digest(cache_key, "pdf") or False,
+            max_age=0,
         )
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
     except Exception as e:
         return str(e), 500
 
@@ -199,14 +556,14 @@ def update_report():
             return jsonify({"error": "Missing cache_key or report_text"}), 400
 
         # Regenerate PDF from the edited text
-        new_pdf_base64 = create_pdf_from_text(updated_text, language)
+        new_pdf_bytes = create_pdf_from_text(updated_text, language)
         
         # Update our storage
-        generated_reports[cache_key] = new_pdf_base64
-        generated_report_texts[cache_key] = updated_text
+        report_store.put(cache_key, "pdf", new_pdf_bytes)
+        report_store.put_text(cache_key, "text", updated_text)
 
         return jsonify({
-            "pdf_base64": new_pdf_base64,
+            "pdf_base64": base64.b64encode(new_pdf_bytes).decode("utf-8"),
             "report_text": updated_text,
             "status": "success"
         })
@@ -238,23 +595,28 @@ def rewrite_segment():
 
 @server.route("/api/chat/init", methods=["POST"])
 def chat_init():
-    """Initialize chat session with Base64 PDF."""
+    """Initialize chat session, from the server-side English report when available,
+    otherwise from the provided Base64 PDF."""
     try:
         data = request.get_json()
         session_id = data.get("session_id")
         pdf_base64 = data.get("pdf_base64")
 
-        if not session_id or not pdf_base64:
-            return jsonify({"error": "Missing session_id or pdf_base64"}), 400
+        if not session_id:
+            return jsonify({"error": "Missing session_id"}), 400
 
-        if session_id in generated_english_reports:
-            safe_print(f"Using server-side ENGLISH PDF for RAG context for topic: {session_id}")
-            pdf_base64 = generated_english_reports[session_id]
-        else:
-            safe_print(f"No English PDF found for {session_id}, using provided PDF.")
-            safe_print(f"Available English Reports: {list(generated_english_reports.keys())}")
+        english_document = report_store.get_json(session_id, "english_document")
+        if english_document:
+            safe_print(f"Indexing server-side ENGLISH report for RAG context for topic: {session_id}")
+            result = init_chat_from_report(session_id, english_document)
+            return jsonify(result)
 
-        result = init_chat_from_base64(session_id, pdf_base64)
+        if not pdf_base64:
+            return jsonify({"error": "Missing pdf_base64"}), 400
+
+        safe_print(f"No English report found for {session_id}, using provided PDF.")
+
+        result = init_chat_from_pdf(session_id, base64.b64decode(pdf_base64))
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -290,6 +652,23 @@ def health():
     return jsonify({"status": "healthy"})
 
 
+@server.route("/api/stats")
+def stats():
+    """Expose LLM scheduler, caches, translation memory, chat session, report store, state backend
+    and job queue counters."""
+    return jsonify({
+        "llm_scheduler": get_scheduler().stats(),
+        "llm_cache": llm_cache.stats(),
+        "subtopic_cache": subtopic_cache.stats(),
+        "search": search_stats(),
+        "translation_memory": translation_stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "report_store": report_store.stats(),
+        "state_backend": state.stats(),
+        "report_jobs": report_jobs.stats(),
+    })
+
+
 @server.route("/")
 def serve_react():
     """Serve main React app."""
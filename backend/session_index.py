@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+from langchain_community.vectorstores import FAISS
+from utils import safe_print
+
+CHAT_INDEX_MEMORY_MB = float(os.getenv("CHAT_INDEX_MEMORY_MB", "256"))
+
+
+def estimate_index_bytes(vectorstore: FAISS) -> int:
+    """Approximate resident size of a FAISS store: float32 vectors plus document text."""
+    index = vectorstore.index
+    size = int(index.ntotal) * int(index.d) * 4
+    docs = getattr(vectorstore.docstore, "_dict", {})
+    size += sum(len(doc.page_content.encode("utf-8")) for doc in docs.values())
+    return size
+
+
+class SessionIndexCache:
+    """Chat vector stores kept in memory within a byte budget.
+
+    The least recently used stores are written to their on-disk path (if not already there)
+    and dropped from memory once the budget is exceeded; a later lookup reloads them.
+    """
+
+    def __init__(self, embeddings, memory_budget_bytes: int = int(CHAT_INDEX_MEMORY_MB * 1024 * 1024)):
+        self.embeddings = embeddings
+        self.memory_budget_bytes = memory_budget_bytes
+        self.entries = OrderedDict()
+        self.resident_bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "loads": 0, "evictions": 0, "spills": 0}
+
+    def put(self, session_id: str, vectorstore: FAISS, path: str, persisted: bool = False) -> None:
+        """Keep a store resident. Unpersisted stores are saved to ``path`` only on eviction."""
+        size = estimate_index_bytes(vectorstore)
+        with self.lock:
+            self._remove(session_id)
+            self.entries[session_id] = {"store": vectorstore, "path": path, "bytes": size, "persisted": persisted}
+            self.resident_bytes += size
+            self._evict_over_budget(keep=session_id)
+
+    def get(self, session_id: str, path: str) -> FAISS:
+        """Return the resident store for a session, loading it from ``path`` if it was evicted
+        (or if the session was recreated with a new index, possibly by another worker)."""
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is not None and entry["path"] == path:
+                self.entries.move_to_end(session_id)
+                self.counters["hits"] += 1
+                return entry["store"]
+
+        vectorstore = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        with self.lock:
+            self.counters["loads"] += 1
+        self.put(session_id, vectorstore, path, persisted=True)
+        return vectorstore
+
+    def drop(self, session_id: str) -> None:
+        with self.lock:
+            self._remove(session_id)
+
+    def resident_ids(self):
+        with self.lock:
+            return list(self.entries)
+
+    def _remove(self, session_id: str) -> None:
+        entry = self.entries.pop(session_id, None)
+        if entry is not None:
+            self.resident_bytes -= entry["bytes"]
+
+    def _evict_over_budget(self, keep: str) -> None:
+        # Spilling happens under the lock so a concurrent get() never finds an evicted
+        # session that is not on disk yet.
+        while self.resident_bytes > self.memory_budget_bytes and len(self.entries) > 1:
+            session_id = next(iter(self.entries))
+            if session_id == keep:
+                self.entries.move_to_end(session_id)
+                continue
+            entry = self.entries.pop(session_id)
+            self.resident_bytes -= entry["bytes"]
+            self.counters["evictions"] += 1
+            if entry["persisted"]:
+                continue
+            try:
+                entry["store"].save_local(entry["path"])
+                self.counters["spills"] += 1
+            except Exception as e:
+                safe_print(f"Could not save evicted chat index to {entry['path']}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["resident_sessions"] = len(self.entries)
+            stats["resident_bytes"] = self.resident_bytes
+        stats["memory_budget_bytes"] = self.memory_budget_bytes
+        return stats
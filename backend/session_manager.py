@@ -0,0 +1,204 @@
+import os
+import time
+import glob
+import shutil
+import uuid
+import hashlib
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+from langchain_community.vectorstores import FAISS
+from session_index import SessionIndexCache
+from state_backend import StateBackend, get_state_backend
+from utils import safe_print
+
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "200"))
+CHAT_REAPER_INTERVAL = float(os.getenv("CHAT_REAPER_INTERVAL", "60"))
+# A directory of our own, since the reaper deletes stale vectorstore_* directories in it
+CHAT_INDEX_DIR = os.getenv("CHAT_INDEX_DIR", os.path.join(tempfile.gettempdir(), "chat_indexes"))
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class SessionManager:
+    """Owns chat sessions: their history, their vector index and its on-disk copy.
+
+    Session records (history, index path, timestamps) live in the state backend, so with a
+    shared backend any worker can serve any session; each worker keeps its own resident index
+    cache and, in that case, indexes are written to disk as soon as they are created.
+    Sessions idle for longer than ``ttl`` seconds are expired by a background reaper thread,
+    the least recently used session is closed when ``max_sessions`` is reached, and closing a
+    session deletes its index directory. Index directories left behind by earlier processes
+    are removed by the reaper once they are older than the TTL.
+    """
+
+    namespace = "chat_sessions"
+
+    def __init__(self, embeddings, ttl: float = CHAT_SESSION_TTL, max_sessions: int = CHAT_MAX_SESSIONS,
+                 reaper_interval: float = CHAT_REAPER_INTERVAL, index_dir: str = CHAT_INDEX_DIR,
+                 state: Optional[StateBackend] = None):
+        self.indexes = SessionIndexCache(embeddings)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.reaper_interval = reaper_interval
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        self.state = state or get_state_backend()
+        self.lock = threading.Lock()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "closed": 0, "orphans_removed": 0}
+        self.disk_bytes = 0
+        self.reaper = threading.Thread(target=self._reap_forever, name="chat-session-reaper", daemon=True)
+        self.reaper.start()
+
+    def index_path(self, session_id: str, generation: str = "") -> str:
+        # Session ids are report topics, so hash them into a safe directory name. The
+        # generation suffix gives a recreated session a fresh directory, so workers holding
+        # the previous index notice the change.
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+        suffix = f"_{generation}" if generation else ""
+        return os.path.join(self.index_dir, f"vectorstore_{digest}{suffix}")
+
+    def _sessions(self) -> Dict[str, Dict[str, Any]]:
+        # A session closed while get touches it leaves a None tombstone behind; not a session
+        return {sid: s for sid, s in self.state.items(self.namespace) if s}
+
+    def create(self, session_id: str, vectorstore: FAISS) -> Dict[str, Any]:
+        """Register a new session (replacing any previous one with the same id)."""
+        self.close(session_id)
+        now = time.time()
+        session = {
+            "vectorstore_path": self.index_path(session_id, uuid.uuid4().hex[:8]),
+            "chat_history": [],
+            "created_at": now,
+            "last_access": now,
+        }
+        sessions = self._sessions()
+        evicted = []
+        while len(sessions) - len(evicted) >= self.max_sessions:
+            oldest = min((sid for sid in sessions if sid not in evicted),
+                         key=lambda sid: sessions[sid]["last_access"])
+            evicted.append(oldest)
+        for sid in evicted:
+            self._forget(sid, sessions[sid])
+        with self.lock:
+            self.counters["evicted"] += len(evicted)
+            self.counters["created"] += 1
+
+        persisted = False
+        if self.state.shared:
+            # Other workers load the index from disk, so it has to be there before the
+            # session becomes visible to them
+            vectorstore.save_local(session["vectorstore_path"])
+            persisted = True
+        self.indexes.put(session_id, vectorstore, session["vectorstore_path"], persisted=persisted)
+        self.state.set(self.namespace, session_id, session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a live session and mark it as used, or None if unknown or expired."""
+        # Plain read first: unknown ids must not cost a write (or leave a row behind)
+        if not self.state.get(self.namespace, session_id):
+            return None
+
+        def touch(session):
+            if session:
+                session["last_access"] = time.time()
+            return session
+
+        return self.state.mutate(self.namespace, session_id, touch) or None
+
+    def index(self, session_id: str) -> FAISS:
+        """Vector index of a live session; does not count as a use (chat calls get first)."""
+        session = self.state.get(self.namespace, session_id)
+        if not session:
+            raise KeyError(session_id)
+        return self.indexes.get(session_id, session["vectorstore_path"])
+
+    def append_history(self, session_id: str, message: str, answer: str) -> None:
+        def append(session):
+            if session:
+                session["chat_history"].append([message, answer])
+            return session
+
+        self.state.mutate(self.namespace, session_id, append)
+
+    def close(self, session_id: str) -> bool:
+        session = self.state.get(self.namespace, session_id)
+        self._forget(session_id, session)
+        if session:
+            with self.lock:
+                self.counters["closed"] += 1
+        return bool(session)
+
+    def _forget(self, session_id: str, session: Optional[Dict[str, Any]]) -> None:
+        self.state.delete(self.namespace, session_id)
+        self.indexes.drop(session_id)
+        if session:
+            shutil.rmtree(session["vectorstore_path"], ignore_errors=True)
+
+    def reap(self) -> int:
+        """Expire idle sessions and remove orphaned index directories. Returns sessions expired."""
+        now = time.time()
+        sessions = {}
+        for sid, session in self.state.items(self.namespace):
+            if not session:
+                self.state.delete(self.namespace, sid)
+            else:
+                sessions[sid] = session
+        expired = [sid for sid, s in sessions.items() if now - s["last_access"] > self.ttl]
+        for sid in expired:
+            self._forget(sid, sessions.pop(sid))
+        with self.lock:
+            self.counters["expired"] += len(expired)
+
+        # Sessions closed by other workers still have an index resident here
+        for sid in self.indexes.resident_ids():
+            if sid not in sessions:
+                self.indexes.drop(sid)
+
+        live_paths = {s["vectorstore_path"] for s in sessions.values()}
+        disk_bytes = 0
+        for path in glob.glob(os.path.join(self.index_dir, "vectorstore_*")):
+            if path in live_paths:
+                disk_bytes += _dir_bytes(path)
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+                    with self.lock:
+                        self.counters["orphans_removed"] += 1
+            except OSError:
+                pass
+        self.disk_bytes = disk_bytes
+
+        if expired:
+            safe_print(f"Expired {len(expired)} idle chat session(s).")
+        return len(expired)
+
+    def _reap_forever(self) -> None:
+        while True:
+            time.sleep(self.reaper_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                safe_print(f"Chat session reaper error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.counters)
+        stats["live_sessions"] = len(self._sessions())
+        stats["max_sessions"] = self.max_sessions
+        stats["ttl_seconds"] = self.ttl
+        stats["disk_bytes"] = self.disk_bytes
+        stats["index"] = self.indexes.stats()
+        return stats
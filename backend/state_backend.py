@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from kv_cache import CACHE_DIR
+from utils import safe_print
+
+# "memory" keeps state in this process only (one gunicorn worker); "sqlite" shares it between
+# the workers on one host; "redis" shares it between hosts. Defaults to redis when REDIS_URL is set.
+REDIS_URL = os.getenv("REDIS_URL", "")
+STATE_BACKEND = os.getenv("STATE_BACKEND", "redis" if REDIS_URL else "memory").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(CACHE_DIR, "state.sqlite3"))
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "insightai:")
+
+
+class StateBackend:
+    """Namespaced key/value state shared by the request handlers and background threads.
+
+    Values must be JSON-serializable. ``mutate`` is an atomic read-modify-write, so workers
+    updating the same key (progress flags, chat history) do not lose each other's writes.
+    ``shared`` tells callers whether other processes see the same state.
+    """
+
+    shared = False
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        raise NotImplementedError
+
+    def mutate(self, namespace: str, key: str, fn: Callable[[Any], Any],
+               ttl: Optional[float] = None) -> Any:
+        """Replace the value with ``fn(current)`` atomically and return it. ``fn`` gets None
+        for a missing key and may be called more than once if another writer interferes."""
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, fields: Dict[str, Any], ttl: Optional[float] = None) -> Dict[str, Any]:
+        """Merge ``fields`` into a dict value."""
+        return self.mutate(namespace, key, lambda current: {**(current or {}), **fields}, ttl=ttl)
+
+    def append(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None,
+               keep: Optional[int] = None) -> int:
+        """Add ``value`` to the log at ``key`` and return its id. Ids increase by one per append
+        and are never reused, also after ``clear_log``; only the newest ``keep`` entries are kept.
+        ``ttl`` applies to the whole log and is refreshed by every append."""
+        raise NotImplementedError
+
+    def read_log(self, namespace: str, key: str, after: int = 0) -> List[Tuple[int, Any]]:
+        """Return the ``(id, value)`` entries of a log with an id above ``after``, oldest first."""
+        raise NotImplementedError
+
+    def clear_log(self, namespace: str, key: str) -> None:
+        """Drop the entries of a log, keeping its id sequence."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+
+def _expiry(ttl: Optional[float]) -> Optional[float]:
+    return time.time() + ttl if ttl else None
+
+
+class MemoryStateBackend(StateBackend):
+    """State in a dict of this process; values are stored as given, not copied."""
+
+    def __init__(self):
+        self.data = {}
+        # (namespace, key) -> [last id, entries as (id, value), expiry]
+        self.logs = {}
+        self.lock = threading.RLock()
+
+    def _live(self, namespace: str, key: str):
+        entry = self.data.get((namespace, key))
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[(namespace, key)]
+            return None
+        return entry
+
+    def get(self, namespace, key, default=None):
+        with self.lock:
+            entry = self._live(namespace, key)
+            return entry[0] if entry is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        with self.lock:
+            self.data[(namespace, key)] = (value, _expiry(ttl))
+
+    def delete(self, namespace, key):
+        with self.lock:
+            self.data.pop((namespace, key), None)
+
+    def items(self, namespace):
+        with self.lock:
+            keys = [k for ns, k in self.data if ns == namespace]
+            live = [(k, self._live(namespace, k)) for k in keys]
+            return [(k, entry[0]) for k, entry in live if entry is not None]
+
+    def mutate(self, namespace, key, fn, ttl=None):
+        with self.lock:
+            entry = self._live(namespace, key)
+            value = fn(entry[0] if entry is not None else None)
+            expires_at = _expiry(ttl) if ttl or entry is None else entry[1]
+            self.data[(namespace, key)] = (value, expires_at)
+            return value
+
+    def _log(self, namespace: str, key: str):
+        log = self.logs.get((namespace, key))
+        if log is not None and log[2] is not None and log[2] <= time.time():
+            log[1] = []
+        return log
+
+    def append(self, namespace, key, value, ttl=None, keep=None):
+        with self.lock:
+            log = self._log(namespace, key) or self.logs.setdefault((namespace, key), [0, [], None])
+            log[0] += 1
+            log[1].append((log[0], value))
+            if keep:
+                del log[1][:-keep]
+            log[2] = _expiry(ttl)
+            return log[0]
+
+    def read_log(self, namespace, key, after=0):
+        with self.lock:
+            log = self._log(namespace, key)
+            return [entry for entry in log[1] if entry[0] > after] if log else []
+
+    def clear_log(self, namespace, key):
+        with self.lock:
+            log = self._log(namespace, key)
+            if log is not None:
+                log[1] = []
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["keys"] = len(self.data)
+        return stats
+
+
+class SQLiteStateBackend(StateBackend):
+    """State in a SQLite file shared by every worker process on the host.
+
+    ``mutate`` runs in a ``BEGIN IMMEDIATE`` transaction, which takes the database write lock,
+    so concurrent read-modify-writes from different processes are serialized.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly where they are needed
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        # Logs are one row per entry, so appending and reading new entries do not touch the
+        # rest of the log; log_seq holds the last id and the expiry of each log
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS log ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, id INTEGER NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key, id))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS log_seq ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, seq INTEGER NOT NULL, expires_at REAL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.lock = threading.Lock()
+        self.writes = 0
+
+    def _read(self, namespace: str, key: str):
+        row = self.conn.execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _write(self, namespace: str, key: str, value: Any, expires_at: Optional[float]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), expires_at),
+        )
+        self._count_write()
+
+    def _count_write(self) -> None:
+        self.writes += 1
+        if self.writes % 500 == 0:
+            now = time.time()
+            self.conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self.conn.execute(
+                "DELETE FROM log WHERE (namespace, key) IN (SELECT namespace, key FROM log_seq "
+                "WHERE expires_at IS NOT NULL AND expires_at <= ?)", (now,)
+            )
+
+    def get(self, namespace, key, default=None):
+        with self.lock:
+            entry = self._read(namespace, key)
+        return entry[0] if entry is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        with self.lock:
+            self._write(namespace, key, value, _expiry(ttl))
+
+    def delete(self, namespace, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, time.time()),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def mutate(self, namespace, key, fn, ttl=None):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                entry = self._read(namespace, key)
+                value = fn(entry[0] if entry is not None else None)
+                expires_at = _expiry(ttl) if ttl or entry is None else entry[1]
+                self._write(namespace, key, value, expires_at)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def append(self, namespace, key, value, ttl=None, keep=None):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT seq, expires_at FROM log_seq WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                seq = (row[0] if row else 0) + 1
+                if row and row[1] is not None and row[1] <= time.time():
+                    self.conn.execute("DELETE FROM log WHERE namespace = ? AND key = ?", (namespace, key))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO log_seq (namespace, key, seq, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, seq, _expiry(ttl)),
+                )
+                self.conn.execute(
+                    "INSERT INTO log (namespace, key, id, value) VALUES (?, ?, ?, ?)",
+                    (namespace, key, seq, json.dumps(value, ensure_ascii=False)),
+                )
+                if keep:
+                    self.conn.execute("DELETE FROM log WHERE namespace = ? AND key = ? AND id <= ?",
+                                      (namespace, key, seq - keep))
+                self._count_write()
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def read_log(self, namespace, key, after=0):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, value FROM log WHERE namespace = ? AND key = ? AND id > ? AND NOT EXISTS ("
+                "SELECT 1 FROM log_seq WHERE namespace = ? AND key = ? AND expires_at <= ?) ORDER BY id",
+                (namespace, key, after, namespace, key, time.time()),
+            ).fetchall()
+        return [(entry_id, json.loads(value)) for entry_id, value in rows]
+
+    def clear_log(self, namespace, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM log WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["keys"] = self.conn.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+        return stats
+
+
+class RedisStateBackend(StateBackend):
+    """State in Redis (or a Redis-compatible server such as Valkey or KeyDB), one JSON value
+    per key. ``mutate`` uses WATCH/MULTI and retries when another client changed the key."""
+
+    shared = True
+
+    # Takes the next id and adds the entry in one step, so readers never see a gap that is
+    # filled later. KEYS: sequence, sorted set of entries; ARGV: value, ttl in ms, entries kept
+    APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], seq, cjson.encode({seq, ARGV[1]}))
+if tonumber(ARGV[3]) > 0 then
+  redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', seq - tonumber(ARGV[3]))
+end
+if tonumber(ARGV[2]) > 0 then
+  redis.call('PEXPIRE', KEYS[1], ARGV[2])
+  redis.call('PEXPIRE', KEYS[2], ARGV[2])
+end
+return seq
+"""
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = STATE_KEY_PREFIX):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.client.ping()
+        self.prefix = prefix
+        self.append_script = self.client.register_script(self.APPEND_SCRIPT)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}{namespace}:{key}"
+
+    def get(self, namespace, key, default=None):
+        raw = self.client.get(self._key(namespace, key))
+        return json.loads(raw) if raw is not None else default
+
+    def set(self, namespace, key, value, ttl=None):
+        self.client.set(self._key(namespace, key), json.dumps(value, ensure_ascii=False),
+                        px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, namespace, key):
+        self.client.delete(self._key(namespace, key))
+
+    def items(self, namespace):
+        prefix = self._key(namespace, "")
+        result = []
+        for redis_key in self.client.scan_iter(match=f"{prefix}*", count=500):
+            raw = self.client.get(redis_key)
+            if raw is not None:
+                result.append((redis_key.decode("utf-8")[len(prefix):], json.loads(raw)))
+        return result
+
+    def mutate(self, namespace, key, fn, ttl=None):
+        import redis
+
+        redis_key = self._key(namespace, key)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(redis_key)
+                    raw = pipe.get(redis_key)
+                    value = fn(json.loads(raw) if raw is not None else None)
+                    pipe.multi()
+                    if ttl or raw is None:
+                        pipe.set(redis_key, json.dumps(value, ensure_ascii=False), px=int(ttl * 1000) if ttl else None)
+                    else:
+                        pipe.set(redis_key, json.dumps(value, ensure_ascii=False), keepttl=True)
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    def append(self, namespace, key, value, ttl=None, keep=None):
+        log_key = self._key(namespace, key)
+        return int(self.append_script(
+            keys=[f"{log_key}:seq", f"{log_key}:log"],
+            args=[json.dumps(value, ensure_ascii=False), int(ttl * 1000) if ttl else 0, keep or 0],
+        ))
+
+    def read_log(self, namespace, key, after=0):
+        raw = self.client.zrangebyscore(f"{self._key(namespace, key)}:log", f"({after}", "+inf")
+        entries = [json.loads(member) for member in raw]
+        return [(int(entry_id), json.loads(value)) for entry_id, value in entries]
+
+    def clear_log(self, namespace, key):
+        self.client.delete(f"{self._key(namespace, key)}:log")
+
+    def stats(self):
+        stats = super().stats()
+        try:
+            stats["keys"] = self.client.dbsize()
+        except Exception:
+            pass
+        return stats
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_state_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    """Build the configured backend, falling back to SQLite if Redis is unavailable."""
+    if kind == "redis":
+        try:
+            return RedisStateBackend()
+        except Exception as e:
+            safe_print(f"⚠️ Redis state backend unavailable ({e}), using SQLite at {STATE_DB_PATH}.")
+            kind = "sqlite"
+    if kind == "sqlite":
+        return SQLiteStateBackend()
+    if kind != "memory":
+        safe_print(f"⚠️ Unknown STATE_BACKEND '{kind}', using in-process state.")
+    return MemoryStateBackend()
+
+
+def get_state_backend() -> StateBackend:
+    """Process-wide state backend, created on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_state_backend()
+        return _backend
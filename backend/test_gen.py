@@ -1,20 +1,18 @@
-from lang import app
+from lang import app, report_run_config, clear_checkpoints
+from utils import safe_print
 import os
 import sys
 
-def safe_print(*args, **kwargs):
-    try:
-        print(*args, **kwargs)
-    except:
-        pass
-
 try:
     safe_print("Testing report generation...")
     topic = "Test Topic"
     language = "English"
     pages = 3
     
-    for state in app.stream({"topic": topic, "language": language, "pages": pages}):
+    thread_id = "test_gen"
+    clear_checkpoints(thread_id)
+
+    for state in app.stream({"topic": topic, "language": language, "pages": pages}, report_run_config(thread_id)):
         safe_print(f"Step completed: {list(state.keys())}")
         if "report_generator" in state:
             safe_print("Success! PDF generated.")
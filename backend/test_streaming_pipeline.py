@@ -0,0 +1,56 @@
+import os
+import threading
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+import pytest
+import lang
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Stub the pipeline's stages; tests make summarize raise for chosen subtopics."""
+    failing = set()
+
+    def summarize(sub, text):
+        if sub in failing:
+            raise lang.DeadlineExceeded(f"LLM request for {sub} did not finish")
+        return f"summary of {sub}"
+
+    monkeypatch.setattr(lang, "cached_subtopic", lambda topic, sub: None)
+    monkeypatch.setattr(lang, "remember_subtopic", lambda *args: None)
+    monkeypatch.setattr(lang, "fetch_subtopic_content", lambda sub, topic: f"content of {sub}")
+    monkeypatch.setattr(lang, "summarize_subtopic", summarize)
+    monkeypatch.setattr(lang, "analyze_subtopic", lambda sub, summary: f"- insight on {sub}")
+    return failing
+
+
+def run_with_timeout(fn, timeout=5.0):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not finish"
+    return outcome
+
+
+def test_streaming_pipeline_processes_every_subtopic(stages):
+    subtopics = [f"Sub {i}" for i in range(6)]
+    outcome = run_with_timeout(lambda: lang.run_streaming_pipeline("Topic", subtopics, workers=2, queue_size=1))
+    result = outcome["result"]
+    assert set(result["summaries"]) == set(subtopics)
+    assert result["insights"]["Sub 3"] == "- insight on Sub 3"
+
+
+def test_streaming_pipeline_raises_stage_error_instead_of_hanging(stages):
+    stages.add("Sub 2")
+    subtopics = [f"Sub {i}" for i in range(6)]
+    outcome = run_with_timeout(lambda: lang.run_streaming_pipeline("Topic", subtopics, workers=2, queue_size=1))
+    assert isinstance(outcome.get("error"), lang.DeadlineExceeded)
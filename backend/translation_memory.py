@@ -0,0 +1,145 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from deep_translator import GoogleTranslator
+from kv_cache import TieredCache, content_hash
+from utils import safe_print
+
+# Google Translate rejects requests over 5000 characters.
+TRANSLATION_BATCH_CHARS = int(os.getenv("TRANSLATION_BATCH_CHARS", "4500"))
+TRANSLATION_BATCH_WORKERS = int(os.getenv("TRANSLATION_BATCH_WORKERS", "4"))
+# Packed segments are joined with a marker the translator leaves alone, then split back.
+SEGMENT_SEPARATOR = "\n[[#]]\n"
+SEGMENT_SPLIT_PATTERN = re.compile(r"\s*\[\[\s*#\s*\]\]\s*")
+
+# Translations do not go stale, so entries have no TTL; the SQLite tier keeps them across
+# restarts and the in-memory LRU bounds process memory.
+translation_memory = TieredCache(
+    "translations",
+    max_items=int(os.getenv("TRANSLATION_MEMORY_MAX_ITEMS", "5000")),
+)
+
+
+def translation_key(text: str, target_code: str) -> str:
+    return f"{target_code}:{content_hash(text)}"
+
+
+def lookup_translation(text: str, target_code: str):
+    """Return a remembered translation, or None."""
+    return translation_memory.get(translation_key(text, target_code))
+
+
+def remember_translation(text: str, target_code: str, translated: str) -> None:
+    if translated:
+        translation_memory.set(translation_key(text, target_code), translated)
+
+
+def translate_cached(text: str, target_code: str, source: str = "en") -> str:
+    """Translate text with Google Translate, consulting the translation memory first.
+
+    Errors from the translator propagate so callers keep their own fallbacks.
+    """
+    if not text or not text.strip():
+        return text
+
+    cached = lookup_translation(text, target_code)
+    if cached is not None:
+        return cached
+
+    translated = GoogleTranslator(source=source, target=target_code).translate(text)
+    remember_translation(text, target_code, translated)
+    return translated if translated is not None else text
+
+
+def _translate_or_none(text: str, target_code: str, source: str) -> Optional[str]:
+    try:
+        return translate_cached(text, target_code, source)
+    except Exception as e:
+        safe_print(f"Translation failed for segment: {e}")
+        return None
+
+
+def _translate_oversized(text: str, target_code: str, source: str) -> Optional[str]:
+    """Translate a segment that does not fit one request, paragraph by paragraph."""
+    paragraphs = [p for p in text.split("\n") if p.strip()]
+    translated = [_translate_or_none(p, target_code, source) for p in paragraphs]
+    if any(t is None for t in translated):
+        return None
+    return "\n\n".join(translated)
+
+
+def _translate_pack(pack: List[str], target_code: str, source: str) -> List[Optional[str]]:
+    """Translate several segments in one request; fall back to one request each if the
+    separators do not survive translation."""
+    if len(pack) == 1:
+        return [_translate_or_none(pack[0], target_code, source)]
+    try:
+        translated = GoogleTranslator(source=source, target=target_code).translate(SEGMENT_SEPARATOR.join(pack))
+        parts = SEGMENT_SPLIT_PATTERN.split((translated or "").strip())
+        if len(parts) == len(pack) and all(part.strip() for part in parts):
+            return parts
+        safe_print(f"Batch translation returned {len(parts)} parts for {len(pack)} segments, retrying individually.")
+    except Exception as e:
+        safe_print(f"Batch translation failed ({e}), retrying individually.")
+    return [_translate_or_none(seg, target_code, source) for seg in pack]
+
+
+def translate_batch(segments: List[str], target_code: str, source: str = "en",
+                    max_chars: int = TRANSLATION_BATCH_CHARS) -> List[str]:
+    """Translate many segments with as few requests as possible.
+
+    Remembered segments are served from the translation memory, duplicates are translated
+    once, and the rest are packed into requests of at most ``max_chars`` characters that run
+    concurrently. Returns translations in input order; segments that fail stay untranslated.
+    """
+    results = list(segments)
+    pending = {}
+    for i, seg in enumerate(segments):
+        if not seg or not seg.strip():
+            continue
+        cached = lookup_translation(seg, target_code)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(seg, []).append(i)
+
+    if not pending:
+        return results
+
+    packs, oversized = [], []
+    current, size = [], 0
+    for seg in pending:
+        if len(seg) > max_chars:
+            oversized.append(seg)
+            continue
+        if current and size + len(SEGMENT_SEPARATOR) + len(seg) > max_chars:
+            packs.append(current)
+            current, size = [], 0
+        size += len(seg) + (len(SEGMENT_SEPARATOR) if current else 0)
+        current.append(seg)
+    if current:
+        packs.append(current)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(TRANSLATION_BATCH_WORKERS, len(packs) + len(oversized)))) as executor:
+        pack_futures = [(pack, executor.submit(_translate_pack, pack, target_code, source)) for pack in packs]
+        big_futures = [(seg, executor.submit(_translate_oversized, seg, target_code, source)) for seg in oversized]
+
+        translated = {}
+        for pack, future in pack_futures:
+            translated.update(zip(pack, future.result()))
+        for seg, future in big_futures:
+            translated[seg] = future.result()
+
+    for seg, indexes in pending.items():
+        result = translated.get(seg)
+        if result is None:
+            continue
+        remember_translation(seg, target_code, result)
+        for i in indexes:
+            results[i] = result
+    return results
+
+
+def translation_stats() -> Dict[str, Any]:
+    return translation_memory.stats()
@@ -0,0 +1,16 @@
+import sys
+
+
+def safe_print(*args, **kwargs):
+    """Print that ignores characters that cannot be encoded by the terminal."""
+    try:
+        print(*args, **kwargs)
+    except UnicodeEncodeError:
+        new_args = []
+        encoding = sys.stdout.encoding or "ascii"
+        for arg in args:
+            if isinstance(arg, str):
+                new_args.append(arg.encode(encoding, errors="ignore").decode(encoding))
+            else:
+                new_args.append(arg)
+        print(*new_args, **kwargs)
@@ -9,6 +9,8 @@ function App() {
   const [activeTopic, setActiveTopic] = useState("");
   const [pdfData, setPdfData] = useState("");
   const [reportText, setReportText] = useState("");
+  // Markdown of the sections generated so far, shown while the report is being produced
+  const [previewText, setPreviewText] = useState("");
   const [isGenerating, setIsGenerating] = useState(false);
   const [progress, setProgress] = useState({
     topicAnalysis: false,
@@ -29,6 +31,7 @@ function App() {
             setTopic={setActiveTopic}
             setPdfUrl={setPdfData}
             setReportText={setReportText}
+            setPreviewText={setPreviewText}
             isGenerating={isGenerating}
             setIsGenerating={setIsGenerating}
             progress={progress}
@@ -46,6 +49,7 @@ function App() {
             setPdfUrl={setPdfData}
             reportText={reportText}
             setReportText={setReportText}
+            previewText={previewText}
             language={language}
             pageCount={pageCount}
             isGenerating={isGenerating}
@@ -1,40 +1,12 @@
 import React from "react";
 import "./ProgressTracker.css";
 
-const ProgressTracker = ({ topic, progress = {}, isGenerating = false }) => {
-  const [currentProgress, setCurrentProgress] = React.useState(progress);
-  const [error, setError] = React.useState(null);
-
-  React.useEffect(() => {
-    if (!topic || !isGenerating) return;
-
-    const pollProgress = async () => {
-      try {
-        const response = await fetch(`http://localhost:5000/progress/${encodeURIComponent(topic)}`);
-        const data = await response.json();
-        
-        if (data.error) {
-          setError(data.error);
-          return;
-        }
-        
-        setCurrentProgress(data.progress);
-        
-        
-        if (data.status === "completed" || data.status === "failed") {
-          return;
-        }
-      } catch (err) {
-        console.error("Error fetching progress:", err);
-        setError("Failed to fetch progress updates");
-      }
-    };
-
-    
-    const interval = setInterval(pollProgress, 2000);
-    return () => clearInterval(interval);
-  }, [topic, isGenerating]);
+const formatEta = (seconds) => {
+  if (seconds < 60) return `about ${Math.max(1, Math.round(seconds))}s left`;
+  return `about ${Math.round(seconds / 60)} min left`;
+};
 
+const ProgressTracker = ({ progress = {}, isGenerating = false, detail = null }) => {
   const stages = [
     { key: "topicAnalysis", label: "Topic Analysis", description: "Analyzing the topic and planning structure" },
     { key: "dataGathering", label: "Data Gathering", description: "Researching and collecting information" },
@@ -88,6 +60,12 @@ const ProgressTracker = ({ topic, progress = {}, isGenerating = false }) => {
           );
         })}
       </div>
+      {isGenerating && detail && detail.subtopicsTotal > 0 && (
+        <p className="progress-detail">
+          Subtopics researched: {detail.subtopicsDone} / {detail.subtopicsTotal}
+          {detail.etaSeconds != null && ` · ${formatEta(detail.etaSeconds)}`}
+        </p>
+      )}
     </div>
   );
 };
@@ -1,4 +1,5 @@
 import React, { useEffect, useState, useRef } from "react";
+import ReactMarkdown from "react-markdown";
 import "./ReportDisplay.css";
 
 export const ReportDisplay = ({
@@ -7,6 +8,7 @@ export const ReportDisplay = ({
   setPdfUrl,
   reportText,
   setReportText,
+  previewText = "",
   language,
   pageCount,
   isGenerating
@@ -242,7 +244,14 @@ export const ReportDisplay = ({
       </div>
 
       <div className="report-content">
-        {isGenerating && (
+        {isGenerating && previewText && (
+          <div className="report-preview">
+            <ReactMarkdown>{previewText}</ReactMarkdown>
+            <p className="loading-subtext">⏳ Generating the remaining sections and the PDF...</p>
+          </div>
+        )}
+
+        {isGenerating && !previewText && (
           <div className="generating-placeholder">
             <div className="loading-spinner"></div>
             <p>⏳ AI is generating your report...</p>
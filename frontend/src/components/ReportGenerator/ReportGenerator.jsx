@@ -1,5 +1,5 @@
 
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import ProgressTracker from "../ProgressTracker/ProgressTracker";
 import "./ReportGenerator.css";
 
@@ -7,6 +7,7 @@ const ReportGenerator = ({
   setTopic,
   setPdfUrl,
   setReportText,
+  setPreviewText,
   isGenerating,
   setIsGenerating,
   progress,
@@ -18,6 +19,11 @@ const ReportGenerator = ({
 }) => {
   const [localTopic, setLocalTopic] = useState("");
   const [error, setError] = useState("");
+  // Report being generated server-side; set once the job is queued so its events can be followed
+  const [activeKey, setActiveKey] = useState(null);
+  const [detail, setDetail] = useState(null);
+  // Preview sections by their position in the report; they arrive in completion order
+  const previewSections = useRef({});
 
 
   const handleSubmit = async (e) => {
@@ -32,6 +38,10 @@ const ReportGenerator = ({
     setError("");
     setTopic(localTopic);
     setPdfUrl(null);
+    setActiveKey(null);
+    setDetail(null);
+    previewSections.current = {};
+    setPreviewText("");
 
 
     setProgress({
@@ -62,8 +72,23 @@ const ReportGenerator = ({
         const text = await res.text();
         throw new Error(`Server error: ${text}`);
       }
+      if (res.status === 429) {
+        throw new Error(`${data.error} (try again in about ${data.retry_after}s)`);
+      }
       if (!res.ok) throw new Error(data.error || "Failed to start report generation");
+
+      if (data.pdf_base64) {
+        // Already generated earlier
+        setPdfUrl(`data:application/pdf;base64,${data.pdf_base64}`);
+        if (data.report_text) {
+          setReportText(data.report_text);
+        }
+        setProgress({ topicAnalysis: true, dataGathering: true, draftingReport: true, finalizing: true });
+        setIsGenerating(false);
+        return;
+      }
       console.log("✅ Report generation started:", data);
+      setActiveKey(`${localTopic}||${language}||${pageCount}`);
     } catch (err) {
       console.error("❌ Error starting report:", err);
       setError(err.message || "Error starting report.");
@@ -73,51 +98,124 @@ const ReportGenerator = ({
 
 
   useEffect(() => {
-    if (!isGenerating || !localTopic) return;
-
-
-    const cacheKey = `${localTopic}||${language}||${pageCount}`;
+    if (!isGenerating || !activeKey) return;
 
-    const interval = setInterval(async () => {
+    const fetchReport = async () => {
       try {
-        const res = await fetch(`/api/progress/${encodeURIComponent(cacheKey)}`);
-        if (!res.ok) throw new Error("Failed to fetch progress");
-
-        const data = await res.json();
-        setProgress(data.progress);
-
-
-        if (data.is_complete) {
-          clearInterval(interval);
-          console.log("🎯 Report complete, fetching PDF...");
-
-          const pdfRes = await fetch(`/api/report/${encodeURIComponent(cacheKey)}`);
-          if (!pdfRes.ok) throw new Error("Failed to fetch report PDF");
-
-          const pdfData = await pdfRes.json();
-          if (pdfData.pdf_base64) {
-            const pdfUrl = `data:application/pdf;base64,${pdfData.pdf_base64}`;
-            setPdfUrl(pdfUrl);
-            if (pdfData.report_text) {
-              setReportText(pdfData.report_text);
-            }
-            console.log("✅ PDF ready for preview");
-          } else {
-            throw new Error("PDF data missing in response");
-          }
+        console.log("🎯 Report complete, fetching PDF...");
+        const pdfRes = await fetch(`/api/report/${encodeURIComponent(activeKey)}`);
+        if (!pdfRes.ok) throw new Error("Failed to fetch report PDF");
 
-          setIsGenerating(false);
+        const pdfData = await pdfRes.json();
+        if (pdfData.pdf_base64) {
+          const pdfUrl = `data:application/pdf;base64,${pdfData.pdf_base64}`;
+          setPdfUrl(pdfUrl);
+          if (pdfData.report_text) {
+            setReportText(pdfData.report_text);
+          }
+          console.log("✅ PDF ready for preview");
+        } else {
+          throw new Error("PDF data missing in response");
         }
       } catch (err) {
-        console.error("⚠️ Progress polling error:", err);
-        setError("Error fetching progress or report data.");
+        console.error("⚠️ Report fetch error:", err);
+        setError("Error fetching report data.");
+      }
+      setIsGenerating(false);
+    };
+
+    // Progress is pushed by the server; EventSource reconnects on its own and resumes
+    // after the last event it received.
+    const progressUrl = `/api/progress/${encodeURIComponent(activeKey)}`;
+    const source = new EventSource(`${progressUrl}/events`);
+    let pollTimer = null;
+
+    source.addEventListener("progress", (e) => {
+      const flags = JSON.parse(e.data);
+      delete flags.error;
+      setProgress(flags);
+    });
+
+    const updateDetail = (e) => {
+      const data = JSON.parse(e.data);
+      if (data.subtopics_total !== undefined) {
+        setDetail({
+          subtopicsDone: data.subtopics_done,
+          subtopicsTotal: data.subtopics_total,
+          etaSeconds: data.eta_seconds,
+        });
+      }
+    };
+    source.addEventListener("node", updateDetail);
+    source.addEventListener("subtopic", updateDetail);
+
+    // Section events only carry the section's position; its markdown is fetched separately
+    source.addEventListener("section", async (e) => {
+      const { order } = JSON.parse(e.data);
+      try {
+        const res = await fetch(`${progressUrl}/sections/${order}`);
+        if (!res.ok) return;
+        const section = await res.json();
+        previewSections.current[order] = section.markdown;
+        const markdown = Object.keys(previewSections.current)
+          .map(Number)
+          .sort((a, b) => a - b)
+          .map((position) => previewSections.current[position])
+          .join("\n\n");
+        setPreviewText(markdown);
+      } catch (err) {
+        console.error("⚠️ Preview section fetch error:", err);
+      }
+    });
+
+    source.addEventListener("status", (e) => {
+      const data = JSON.parse(e.data);
+      if (data.progress) {
+        const flags = { ...data.progress };
+        delete flags.error;
+        setProgress(flags);
+      }
+      if (data.status === "completed") {
+        source.close();
+        fetchReport();
+      } else if (data.status === "failed") {
+        source.close();
+        setError(data.error || "Report generation failed.");
         setIsGenerating(false);
-        clearInterval(interval);
       }
-    }, 1000);
+    });
+
+    // The server refuses streams when it has too many open (503), and EventSource does not
+    // retry a refused stream; poll the progress endpoint instead until the report is done.
+    source.onerror = () => {
+      if (source.readyState !== EventSource.CLOSED || pollTimer) return;
+      pollTimer = setInterval(async () => {
+        try {
+          const res = await fetch(progressUrl);
+          if (!res.ok) return;
+          const data = await res.json();
+          const flags = { ...data.progress };
+          delete flags.error;
+          setProgress(flags);
+          if (data.status === "completed") {
+            clearInterval(pollTimer);
+            fetchReport();
+          } else if (data.status === "failed") {
+            clearInterval(pollTimer);
+            setError("Report generation failed.");
+            setIsGenerating(false);
+          }
+        } catch (err) {
+          console.error("⚠️ Progress poll error:", err);
+        }
+      }, 2000);
+    };
 
-    return () => clearInterval(interval);
-  }, [isGenerating, localTopic, language, pageCount, setProgress, setPdfUrl, setIsGenerating]);
+    return () => {
+      source.close();
+      clearInterval(pollTimer);
+    };
+  }, [isGenerating, activeKey, setProgress, setPdfUrl, setReportText, setPreviewText, setIsGenerating]);
 
   const exampleTopics = [
     "Artificial Intelligence in Healthcare",
@@ -217,7 +315,7 @@ const ReportGenerator = ({
 
       { }
       <div className="tracker-container">
-        <ProgressTracker progress={progress} isGenerating={isGenerating} />
+        <ProgressTracker progress={progress} isGenerating={isGenerating} detail={detail} />
       </div>
 
       { }